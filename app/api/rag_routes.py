@@ -1,9 +1,14 @@
 """
 RAG API endpoints
 """
-from fastapi import APIRouter, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from typing import List, Optional, Tuple
+from collections import Counter
+import asyncio
 import logging
+import time
 
 from app.models.schemas import (
     QueryRequest,
@@ -15,17 +20,44 @@ from app.models.schemas import (
     DocumentStats,
     ProcessingStatusEnum
 )
-from app.services.rag_service import get_rag_service
-from app.services.pdf_processor import get_pdf_processor
-from app.utils.supabase_client import supabase
+from app.services.rag_service import RAGService
+from app.services.pdf_processor import PDFProcessor
+from app.utils.supabase_client import get_supabase_client
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# /stats cache with stale-while-revalidate semantics: entries younger than
+# the TTL are served directly; entries younger than the stale window are
+# served immediately while a background task refreshes them.
+_STATS_TTL_SECONDS = 60
+_STATS_STALE_SECONDS = 300
+_stats_cache: Optional[Tuple[float, DocumentStats]] = None
+_stats_refresh_task: Optional[asyncio.Task] = None
+
+
+def _invalidate_stats_cache() -> None:
+    """Drop the cached /stats response after document ingestion"""
+    global _stats_cache
+    _stats_cache = None
+
+
+def _rag_service_dep(request: Request) -> RAGService:
+    """Resolve the RAGService singleton built in the app lifespan"""
+    return request.app.state.rag_service
+
+
+def _pdf_processor_dep(request: Request) -> PDFProcessor:
+    """Resolve the PDFProcessor singleton built in the app lifespan"""
+    return request.app.state.pdf_processor
+
 
 @router.post("/query", response_model=QueryResponse)
-async def query_rag(request: QueryRequest) -> QueryResponse:
+async def query_rag(
+    request: QueryRequest,
+    rag_service: RAGService = Depends(_rag_service_dep)
+) -> QueryResponse:
     """
     Query the RAG system with a user question
 
@@ -37,7 +69,6 @@ async def query_rag(request: QueryRequest) -> QueryResponse:
     """
     try:
         logger.info(f"Received query: {request.query}")
-        rag_service = get_rag_service()
         response = await rag_service.query(request.query)
         return response
 
@@ -52,8 +83,38 @@ async def query_rag(request: QueryRequest) -> QueryResponse:
         )
 
 
+@router.post("/query/stream")
+async def query_rag_stream(
+    request: QueryRequest,
+    rag_service: RAGService = Depends(_rag_service_dep)
+) -> StreamingResponse:
+    """
+    Query the RAG system and stream the answer as server-sent events
+
+    Answer fragments are sent as they are generated, followed by a final
+    metadata event with the source documents. /query remains available
+    for clients that need the full response in one payload.
+
+    Args:
+        request: QueryRequest with user query
+
+    Returns:
+        StreamingResponse emitting SSE frames
+    """
+    logger.info(f"Received streaming query: {request.query}")
+    return StreamingResponse(
+        rag_service.query_stream(request.query),
+        media_type="text/event-stream",
+        # Opt out of GZipMiddleware so events are flushed immediately
+        headers={"Content-Encoding": "identity"}
+    )
+
+
 @router.post("/process-pdf", response_model=ProcessPDFResponse)
-async def process_pdf(request: ProcessPDFRequest) -> ProcessPDFResponse:
+async def process_pdf(
+    request: ProcessPDFRequest,
+    pdf_processor: PDFProcessor = Depends(_pdf_processor_dep)
+) -> ProcessPDFResponse:
     """
     Process a single PDF document
 
@@ -65,12 +126,15 @@ async def process_pdf(request: ProcessPDFRequest) -> ProcessPDFResponse:
     """
     try:
         logger.info(f"Processing PDF: {request.filename}")
-        pdf_processor = get_pdf_processor()
         result = await pdf_processor.process_pdf(
             request.file_path,
             request.filename,
             request.category
         )
+
+        if result.status == ProcessingStatusEnum.COMPLETED:
+            _invalidate_stats_cache()
+
         return result
 
     except Exception as e:
@@ -85,7 +149,10 @@ async def process_pdf(request: ProcessPDFRequest) -> ProcessPDFResponse:
 
 
 @router.post("/process-batch", response_model=ProcessBatchResponse)
-async def process_batch(request: ProcessBatchRequest) -> ProcessBatchResponse:
+async def process_batch(
+    request: ProcessBatchRequest,
+    pdf_processor: PDFProcessor = Depends(_pdf_processor_dep)
+) -> ProcessBatchResponse:
     """
     Process multiple PDF documents in batch
 
@@ -97,7 +164,6 @@ async def process_batch(request: ProcessBatchRequest) -> ProcessBatchResponse:
     """
     try:
         logger.info(f"Processing batch of {len(request.file_paths)} PDFs")
-        pdf_processor = get_pdf_processor()
         results = await pdf_processor.process_multiple_pdfs(
             request.file_paths,
             request.category
@@ -106,6 +172,9 @@ async def process_batch(request: ProcessBatchRequest) -> ProcessBatchResponse:
         successful = sum(1 for r in results if r.status == ProcessingStatusEnum.COMPLETED)
         failed = sum(1 for r in results if r.status == ProcessingStatusEnum.ERROR)
 
+        if successful:
+            _invalidate_stats_cache()
+
         return ProcessBatchResponse(
             results=results,
             total=len(results),
@@ -125,52 +194,32 @@ async def process_batch(request: ProcessBatchRequest) -> ProcessBatchResponse:
 
 
 @router.get("/stats", response_model=DocumentStats)
-async def get_stats() -> DocumentStats:
+async def get_stats(response: Response) -> DocumentStats:
     """
     Get statistics about processed documents
 
+    Results are cached in-process for 60 seconds; stale entries (up to 5
+    minutes old) are served immediately while refreshed in the background.
+
     Returns:
         DocumentStats with aggregated statistics
     """
-    try:
-        # Get document counts by category
-        docs_response = supabase.table('documents').select('category, document_type').execute()
-
-        if not docs_response.data:
-            return DocumentStats(
-                total_documents=0,
-                total_chunks=0,
-                total_pages=0,
-                categories={},
-                document_types={}
-            )
-
-        # Count chunks
-        chunks_response = supabase.table('document_chunks').select('id', count='exact').execute()
-        total_chunks = chunks_response.count if chunks_response.count else 0
+    global _stats_refresh_task
 
-        # Get total pages
-        pages_response = supabase.table('documents').select('total_pages').execute()
-        total_pages = sum(doc.get('total_pages', 0) for doc in pages_response.data) if pages_response.data else 0
-
-        # Aggregate by category and type
-        categories = {}
-        document_types = {}
-
-        for doc in docs_response.data:
-            category = doc.get('category', 'unknown')
-            doc_type = doc.get('document_type', 'unknown')
+    try:
+        response.headers["Cache-Control"] = "public, max-age=60, stale-while-revalidate=240"
 
-            categories[category] = categories.get(category, 0) + 1
-            document_types[doc_type] = document_types.get(doc_type, 0) + 1
+        if _stats_cache is not None:
+            age = time.monotonic() - _stats_cache[0]
+            if age < _STATS_TTL_SECONDS:
+                return _stats_cache[1]
+            if age < _STATS_STALE_SECONDS:
+                # Serve stale and revalidate in the background
+                if _stats_refresh_task is None or _stats_refresh_task.done():
+                    _stats_refresh_task = asyncio.create_task(_refresh_stats())
+                return _stats_cache[1]
 
-        return DocumentStats(
-            total_documents=len(docs_response.data),
-            total_chunks=total_chunks,
-            total_pages=total_pages,
-            categories=categories,
-            document_types=document_types
-        )
+        return await _refresh_stats()
 
     except Exception as e:
         logger.error(f"Error in /stats endpoint: {e}", exc_info=True)
@@ -181,3 +230,71 @@ async def get_stats() -> DocumentStats:
                 "message": str(e)
             }
         )
+
+
+async def _refresh_stats() -> DocumentStats:
+    """Recompute document statistics and update the cache"""
+    global _stats_cache
+
+    # The Supabase client is synchronous; run it in the threadpool so the
+    # round-trip doesn't block the event loop for concurrent /query traffic
+    stats = await run_in_threadpool(_fetch_stats)
+    _stats_cache = (time.monotonic(), stats)
+    return stats
+
+
+def _fetch_stats() -> DocumentStats:
+    """Fetch document statistics from Supabase"""
+    # Resolved here rather than at import so app boot doesn't build the
+    # sync client (the factory caches it after the first call)
+    supabase = get_supabase_client()
+
+    # Aggregate server-side in a single round-trip (see sql/get_document_stats.sql)
+    try:
+        response = supabase.rpc('get_document_stats').execute()
+        if response.data:
+            return DocumentStats(**response.data)
+    except Exception as rpc_error:
+        logger.warning(f"get_document_stats RPC unavailable, aggregating client-side: {rpc_error}")
+
+    return _compute_stats_client_side()
+
+
+def _compute_stats_client_side() -> DocumentStats:
+    """Fallback aggregation when the get_document_stats RPC is not deployed"""
+    supabase = get_supabase_client()
+
+    # One select covers categories, types and pages
+    docs_response = supabase.table('documents').select('category, document_type, total_pages').execute()
+
+    if not docs_response.data:
+        return DocumentStats(
+            total_documents=0,
+            total_chunks=0,
+            total_pages=0,
+            categories={},
+            document_types={}
+        )
+
+    # Count chunks
+    chunks_response = supabase.table('document_chunks').select('id', count='exact').execute()
+    total_chunks = chunks_response.count if chunks_response.count else 0
+
+    # Aggregate categories, types and pages in a single walk over the rows
+    categories = Counter()
+    document_types = Counter()
+    total_pages = 0
+
+    for doc in docs_response.data:
+        categories[doc.get('category', 'unknown')] += 1
+        document_types[doc.get('document_type', 'unknown')] += 1
+        total_pages += doc.get('total_pages', 0) or 0
+
+    return DocumentStats(
+        total_documents=len(docs_response.data),
+        total_chunks=total_chunks,
+        total_pages=total_pages,
+        categories=dict(categories),
+        document_types=dict(document_types)
+    )
+
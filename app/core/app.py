@@ -3,7 +3,9 @@ FastAPI application factory
 """
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+from contextlib import asynccontextmanager
 from datetime import datetime
 import logging
 
@@ -18,6 +20,30 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+@asynccontextmanager
+async def lifespan(application: FastAPI):
+    """Construct shared service singletons once, before serving traffic
+
+    Request-time lazy construction is not concurrency-safe (two first
+    requests can race the None-check) and pushes the one-time client setup
+    cost onto an unlucky request. Build everything here and attach it to
+    app.state for lock-free access.
+    """
+    from app.services.rag_service import RAGService
+    from app.services.pdf_processor import PDFProcessor
+    from app.services.embedding_service import get_query_embedder
+
+    application.state.rag_service = RAGService()
+    application.state.pdf_processor = PDFProcessor()
+
+    query_embedder = get_query_embedder()
+    query_embedder.start()
+
+    yield
+
+    await query_embedder.stop()
+
+
 def create_application() -> FastAPI:
     """Create and configure FastAPI application"""
 
@@ -26,7 +52,9 @@ def create_application() -> FastAPI:
         version=settings.VERSION,
         description="API para asistente virtual de trámites municipales usando RAG",
         docs_url="/docs",
-        redoc_url="/redoc"
+        redoc_url="/redoc",
+        default_response_class=ORJSONResponse,
+        lifespan=lifespan
     )
 
     # Configure CORS
@@ -38,11 +66,15 @@ def create_application() -> FastAPI:
         allow_headers=["*"],
     )
 
+    # Compress large JSON/HTML payloads (/stats, /query answers); the SSE
+    # streaming endpoint opts out by presetting its Content-Encoding
+    application.add_middleware(GZipMiddleware, minimum_size=1024)
+
     # Health check endpoint
     @application.get("/health")
     async def health_check():
         """Health check endpoint"""
-        return JSONResponse({
+        return ORJSONResponse({
             "status": "ok",
             "timestamp": datetime.utcnow().isoformat(),
             "service": settings.APP_NAME,
@@ -60,7 +92,7 @@ def create_application() -> FastAPI:
     @application.exception_handler(Exception)
     async def global_exception_handler(request, exc):
         logger.error(f"Unhandled exception: {exc}", exc_info=True)
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=500,
             content={
                 "error": "Error interno del servidor",
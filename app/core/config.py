@@ -1,10 +1,8 @@
 """
 Application configuration using Pydantic Settings
 """
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 from functools import lru_cache
-import os
-from typing import Optional
 
 
 class Settings(BaseSettings):
@@ -17,12 +15,16 @@ class Settings(BaseSettings):
     HOST: str = "0.0.0.0"
     PORT: int = 8000
 
-    # CORS
-    CORS_ORIGINS: list[str] = ["http://localhost:3000", "http://localhost:5173", "http://localhost:5174", "http://localhost:8000"]
+    # CORS (tuple so the frozen settings object stays hashable)
+    CORS_ORIGINS: tuple[str, ...] = ("http://localhost:3000", "http://localhost:5173", "http://localhost:5174", "http://localhost:8000")
 
     # Supabase
     SUPABASE_URL: str
     SUPABASE_KEY: str
+    # Direct Postgres connection string (Supabase "connection pooling" URI).
+    # When set, vector search bypasses PostgREST and talks to Postgres over
+    # asyncpg's binary protocol; when unset, search falls back to the RPC.
+    DATABASE_URL: str = ""
 
     # Google Gemini AI
     GEMINI_API_KEY: str
@@ -34,19 +36,23 @@ class Settings(BaseSettings):
     RAG_CHUNK_OVERLAP: int = 200
     RAG_SIMILARITY_THRESHOLD: float = 0.4
     RAG_TOP_K_RESULTS: int = 5
+    # ANN candidate pool fetched from Supabase before the local exact-cosine
+    # rerank narrows it down to RAG_TOP_K_RESULTS
+    RAG_RERANK_POOL: int = 50
+    # Query-embedding micro-batching: concurrent /query requests landing
+    # within the wait window share one Gemini embed call
+    RAG_EMBED_MAX_BATCH: int = 32
+    RAG_EMBED_MAX_WAIT_MS: int = 10
 
     # PDF Processing
     PDF_STORAGE_BUCKET: str = "documentos_municipales"
 
-    class Config:
-        env_file = ".env"
-        env_file_encoding = "utf-8"
-        case_sensitive = True
-
-        # Map VITE_ prefixed variables
-        @classmethod
-        def parse_env_var(cls, field_name: str, raw_val: str) -> any:
-            return raw_val
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        env_file_encoding="utf-8",
+        case_sensitive=True,
+        frozen=True
+    )
 
 
 @lru_cache()
@@ -1,7 +1,7 @@
 """
 Pydantic models for request/response validation
 """
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional, List, Dict, Any
 from enum import Enum
 
@@ -18,12 +18,11 @@ class QueryRequest(BaseModel):
     """Request model for RAG query"""
     query: str = Field(..., min_length=1, description="User query text")
 
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "query": "¿Cómo solicito una licencia de funcionamiento para mi bodega?"
-            }
+    model_config = ConfigDict(json_schema_extra={
+        "example": {
+            "query": "¿Cómo solicito una licencia de funcionamiento para mi bodega?"
         }
+    })
 
 
 class QueryResponse(BaseModel):
@@ -33,14 +32,13 @@ class QueryResponse(BaseModel):
     download_url: Optional[str] = Field(None, description="Document download URL")
     sources: Optional[List[str]] = Field(None, description="List of source documents")
 
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "answer": "<p>Para solicitar una licencia de funcionamiento...</p>",
-                "document_name": "Formato_Licencia_Bodega.pdf",
-                "sources": ["Formato_Licencia_Bodega.pdf", "Ley_27972.pdf"]
-            }
+    model_config = ConfigDict(json_schema_extra={
+        "example": {
+            "answer": "<p>Para solicitar una licencia de funcionamiento...</p>",
+            "document_name": "Formato_Licencia_Bodega.pdf",
+            "sources": ["Formato_Licencia_Bodega.pdf", "Ley_27972.pdf"]
         }
+    })
 
 
 class ProcessPDFRequest(BaseModel):
@@ -49,14 +47,13 @@ class ProcessPDFRequest(BaseModel):
     filename: str = Field(..., description="PDF filename")
     category: Optional[str] = Field(None, description="Document category")
 
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "file_path": "./documentos/ley_27972.pdf",
-                "filename": "ley_27972.pdf",
-                "category": "normativa"
-            }
+    model_config = ConfigDict(json_schema_extra={
+        "example": {
+            "file_path": "./documentos/ley_27972.pdf",
+            "filename": "ley_27972.pdf",
+            "category": "normativa"
         }
+    })
 
 
 class ProcessingStatus(BaseModel):
@@ -68,16 +65,15 @@ class ProcessingStatus(BaseModel):
     chunks_created: Optional[int] = Field(None, description="Number of chunks created")
     error_message: Optional[str] = Field(None, description="Error message if failed")
 
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "document_id": "uuid-123",
-                "filename": "ley_27972.pdf",
-                "status": "completed",
-                "progress": 100,
-                "chunks_created": 45
-            }
+    model_config = ConfigDict(json_schema_extra={
+        "example": {
+            "document_id": "uuid-123",
+            "filename": "ley_27972.pdf",
+            "status": "completed",
+            "progress": 100,
+            "chunks_created": 45
         }
+    })
 
 
 class ProcessPDFResponse(ProcessingStatus):
@@ -90,13 +86,12 @@ class ProcessBatchRequest(BaseModel):
     file_paths: List[str] = Field(..., description="List of PDF file paths")
     category: Optional[str] = Field(None, description="Category for all documents")
 
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "file_paths": ["./docs/ley1.pdf", "./docs/ley2.pdf"],
-                "category": "normativa"
-            }
+    model_config = ConfigDict(json_schema_extra={
+        "example": {
+            "file_paths": ["./docs/ley1.pdf", "./docs/ley2.pdf"],
+            "category": "normativa"
         }
+    })
 
 
 class ProcessBatchResponse(BaseModel):
@@ -115,13 +110,12 @@ class DocumentStats(BaseModel):
     categories: Dict[str, int] = Field(default_factory=dict, description="Documents by category")
     document_types: Dict[str, int] = Field(default_factory=dict, description="Documents by type")
 
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "total_documents": 50,
-                "total_chunks": 1250,
-                "total_pages": 850,
-                "categories": {"normativa": 30, "comercio": 20},
-                "document_types": {"ley": 15, "formulario": 20, "ordenanza": 15}
-            }
+    model_config = ConfigDict(json_schema_extra={
+        "example": {
+            "total_documents": 50,
+            "total_chunks": 1250,
+            "total_pages": 850,
+            "categories": {"normativa": 30, "comercio": 20},
+            "document_types": {"ley": 15, "formulario": 20, "ordenanza": 15}
         }
+    })
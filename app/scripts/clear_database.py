@@ -39,15 +39,11 @@ def clear_database():
             logger.info("✅ Database is already empty!")
             return
 
-        # Delete all chunks first (due to foreign key constraint)
-        logger.info("\n🗑️  Deleting all document chunks...")
-        supabase.table('document_chunks').delete().neq('id', '00000000-0000-0000-0000-000000000000').execute()
-        logger.info(f"✅ Deleted {chunks_count} chunks")
-
-        # Delete all documents
-        logger.info("🗑️  Deleting all documents...")
-        supabase.table('documents').delete().neq('id', '00000000-0000-0000-0000-000000000000').execute()
-        logger.info(f"✅ Deleted {docs_count} documents")
+        # Truncate both tables server-side (see sql/truncate_rag_tables.sql);
+        # a single TRUNCATE replaces the old row-by-row REST deletes
+        logger.info("\n🗑️  Truncating documents and chunks...")
+        supabase.rpc('truncate_rag_tables').execute()
+        logger.info(f"✅ Deleted {docs_count} documents and {chunks_count} chunks")
 
         logger.info("\n🎉 Database cleanup completed successfully!")
         logger.info("You can now process PDFs to generate new chunks.")
@@ -48,28 +48,32 @@ async def main():
     # Get PDF processor
     pdf_processor = get_pdf_processor()
 
-    # Process each PDF
-    results = []
-    for i, pdf_path in enumerate(pdf_files, 1):
-        logger.info(f"\n{'='*60}")
-        logger.info(f"Processing file {i}/{len(pdf_files)}: {pdf_path.name}")
-        logger.info(f"{'='*60}")
-
-        result = await pdf_processor.process_pdf(
-            str(pdf_path),
-            pdf_path.name,
-            category=None  # Auto-detect category
-        )
-
-        results.append(result)
-
-        if result.status == "completed":
-            logger.info(f"✅ Successfully processed: {pdf_path.name}")
-            logger.info(f"   - Document ID: {result.document_id}")
-            logger.info(f"   - Chunks created: {result.chunks_created}")
-        elif result.status == "error":
-            logger.error(f"❌ Failed to process: {pdf_path.name}")
-            logger.error(f"   - Error: {result.error_message}")
+    # Process PDFs concurrently with bounded parallelism; most of the work
+    # per file is I/O (embedding API and Supabase) and overlaps well
+    concurrency = int(os.getenv("PDF_PROCESS_CONCURRENCY", "4"))
+    semaphore = asyncio.Semaphore(concurrency)
+    logger.info(f"⚙️  Processing with concurrency: {concurrency}")
+
+    async def process_one(pdf_path: Path):
+        async with semaphore:
+            logger.info(f"▶️  Processing: {pdf_path.name}")
+            result = await pdf_processor.process_pdf(
+                str(pdf_path),
+                pdf_path.name,
+                category=None  # Auto-detect category
+            )
+
+            if result.status == "completed":
+                logger.info(f"✅ Successfully processed: {pdf_path.name}")
+                logger.info(f"   - Document ID: {result.document_id}")
+                logger.info(f"   - Chunks created: {result.chunks_created}")
+            elif result.status == "error":
+                logger.error(f"❌ Failed to process: {pdf_path.name}")
+                logger.error(f"   - Error: {result.error_message}")
+
+            return result
+
+    results = await asyncio.gather(*(process_one(pdf_path) for pdf_path in pdf_files))
 
     # Summary
     logger.info(f"\n{'='*60}")
@@ -0,0 +1,92 @@
+"""
+Script to precompute answers for the (trámite, attribute) grid
+Usage: python -m app.scripts.warm_generative_cache
+
+Most municipal queries decompose into a known trámite plus one of a few
+attributes (requisitos/costo/plazo/formulario). Generating those answers
+offline and storing them in the generative_cache table lets the live
+service answer such queries without touching Gemini at all.
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from app.services.rag_service import get_rag_service
+from app.utils.supabase_client import supabase
+import logging
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Attribute -> canonical question template
+ATTRIBUTE_QUESTIONS = {
+    'requisitos': '¿Cuáles son los requisitos para {tramite}?',
+    'costo': '¿Cuánto cuesta el trámite de {tramite}?',
+    'plazo': '¿Cuánto demora el trámite de {tramite}?',
+    'formulario': '¿Dónde encuentro el formulario para {tramite}?',
+}
+
+
+def _known_tramites():
+    """Collect (tramite, keywords) pairs from ingested document metadata"""
+    response = supabase.table('documents').select('metadata').execute()
+    tramites = {}
+    for row in response.data or []:
+        metadata = row.get('metadata') or {}
+        name = metadata.get('nombre_tramite')
+        if name:
+            tramites[name] = metadata.get('palabras_clave', [])
+    return tramites
+
+
+async def main():
+    """Generate and store an answer per (trámite, attribute) pair"""
+    tramites = _known_tramites()
+    if not tramites:
+        logger.warning("⚠️  No trámites found in document metadata; nothing to warm")
+        return
+
+    logger.info(f"🔥 Warming generative cache for {len(tramites)} trámites")
+    rag_service = get_rag_service()
+
+    generated = 0
+    for tramite, keywords in tramites.items():
+        for attribute, template in ATTRIBUTE_QUESTIONS.items():
+            question = template.format(tramite=tramite)
+            logger.info(f"▶️  {tramite} / {attribute}")
+
+            # Bypass the grid and semantic caches: canonical questions must
+            # always run full retrieval, or a previous warm run's answers
+            # would be re-cached under other trámites
+            response = await rag_service._run_query(
+                question, question.casefold().strip(), None, skip_caches=True
+            )
+            if not response.sources:
+                # No documents backed the answer; don't cache boilerplate
+                logger.info("   ↳ skipped (no sources)")
+                continue
+
+            supabase.table('generative_cache').upsert(
+                {
+                    'tramite': tramite,
+                    'attribute': attribute,
+                    'keywords': keywords,
+                    'answer_html': response.answer,
+                    'document_name': response.document_name,
+                    'sources': response.sources,
+                },
+                on_conflict='tramite,attribute'
+            ).execute()
+            generated += 1
+
+    logger.info(f"✅ Generative cache warmed: {generated} entries")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,22 +1,113 @@
 """
 Embedding service using Google Gemini AI
 """
-import google.generativeai as genai
-from typing import List
+from typing import List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 import asyncio
 import logging
+from functools import lru_cache
+from cachetools import LRUCache
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Rough token estimate (~4 characters per token) used to keep each batched
+# embedding request under the API's per-request token limit; oversized
+# requests are rejected outright and force a full retry
+_CHARS_PER_TOKEN = 4
+_MAX_TOKENS_PER_REQUEST = 20_000
+
+# Query embeddings keyed by normalized query text; repeated questions
+# (common for municipal FAQs) skip the Gemini round-trip entirely.
+# Values are stored as tuples to keep cached vectors immutable.
+_QUERY_EMBED_CACHE: LRUCache = LRUCache(maxsize=2048)
+
+
+@lru_cache()
+def _genai():
+    """
+    Import google.generativeai on first use
+
+    The import drags in gRPC/protobuf initialization (hundreds of ms),
+    which shouldn't tax FastAPI boot or --reload cycles when only the
+    static command paths end up being exercised.
+    """
+    import google.generativeai as genai
+    return genai
+
+
+def _estimate_tokens(text: str) -> int:
+    """Cheap token-count approximation for batch packing"""
+    return len(text) // _CHARS_PER_TOKEN
+
+
+def _pack_batches(texts: List[str], batch_size: int) -> List[List[str]]:
+    """
+    Greedily pack texts into batches bounded by count and token budget
+
+    Args:
+        texts: Texts to pack, in order
+        batch_size: Maximum number of texts per batch
+
+    Returns:
+        List of batches, each within the per-request token budget
+    """
+    batches = []
+    current: List[str] = []
+    current_tokens = 0
+
+    for text in texts:
+        tokens = _estimate_tokens(text)
+        if current and (
+            len(current) >= batch_size
+            or current_tokens + tokens > _MAX_TOKENS_PER_REQUEST
+        ):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(text)
+        current_tokens += tokens
+
+    if current:
+        batches.append(current)
+
+    return batches
+
+
+@lru_cache()
+def configure_genai() -> None:
+    """Configure the shared Gemini SDK client once per process
+
+    genai.configure resets the SDK's cached client/channel, so calling it
+    from every service constructor discards the persistent connection the
+    previous caller warmed up. Funneling configuration through this cached
+    helper lets all services reuse one keep-alive channel and amortize the
+    TLS handshake across the lifetime of the process.
+    """
+    _genai().configure(api_key=settings.GEMINI_API_KEY)
+
 
 class EmbeddingService:
     """Service for generating text embeddings using Gemini"""
 
-    def __init__(self):
-        """Initialize Gemini AI client"""
-        genai.configure(api_key=settings.GEMINI_API_KEY)
+    def __init__(self, max_concurrency: int = 8):
+        """
+        Initialize Gemini AI client
+
+        Args:
+            max_concurrency: Maximum number of embedding requests in flight
+        """
+        configure_genai()
         self.model_name = settings.GEMINI_EMBEDDING_MODEL
+        # Precompute the model path and per-task kwargs once instead of
+        # rebuilding them on every embed call
+        self._model_path = f"models/{self.model_name}"
+        self._doc_kwargs = dict(model=self._model_path, task_type="retrieval_document")
+        self._query_kwargs = dict(model=self._model_path, task_type="retrieval_query")
+        self.max_concurrency = max_concurrency
+        # Dedicated pool so batch embedding doesn't saturate the default
+        # asyncio executor shared with the rest of the application
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency)
         logger.info(f"EmbeddingService initialized with model: {self.model_name}")
 
     async def generate_embedding(self, text: str) -> List[float]:
@@ -30,15 +121,11 @@ class EmbeddingService:
             List of floats representing the embedding vector (768 dimensions)
         """
         try:
-            # Run in thread pool to avoid blocking
-            loop = asyncio.get_event_loop()
+            # Run on the dedicated pool to avoid blocking the event loop
+            loop = asyncio.get_running_loop()
             result = await loop.run_in_executor(
-                None,
-                lambda: genai.embed_content(
-                    model=f"models/{self.model_name}",
-                    content=text,
-                    task_type="retrieval_document"
-                )
+                self._pool,
+                lambda: _genai().embed_content(content=text, **self._doc_kwargs)
             )
             return result['embedding']
         except Exception as e:
@@ -55,66 +142,240 @@ class EmbeddingService:
         Returns:
             List of floats representing the embedding vector
         """
+        cache_key = query.strip().lower()
+        cached = _QUERY_EMBED_CACHE.get(cache_key)
+        if cached is not None:
+            return list(cached)
+
         try:
-            loop = asyncio.get_event_loop()
+            loop = asyncio.get_running_loop()
             result = await loop.run_in_executor(
-                None,
-                lambda: genai.embed_content(
-                    model=f"models/{self.model_name}",
-                    content=query,
-                    task_type="retrieval_query"
-                )
+                self._pool,
+                lambda: _genai().embed_content(content=query, **self._query_kwargs)
             )
-            return result['embedding']
+            embedding = result['embedding']
+            _QUERY_EMBED_CACHE[cache_key] = tuple(embedding)
+            return embedding
         except Exception as e:
             logger.error(f"Error generating query embedding: {e}")
             raise
 
+    async def stream_batch_embeddings(
+        self,
+        texts: List[str],
+        batch_size: int = 100
+    ):
+        """
+        Yield (offset, embeddings) per packed batch as each completes
+
+        The Gemini embedding endpoint accepts a list of texts per request,
+        so N texts cost ceil(N / batch_size) round-trips instead of N.
+        Batches are additionally packed against a per-request token budget
+        so oversized requests don't get rejected and retried. Up to
+        `max_concurrency` batches are kept in flight simultaneously, and
+        each batch is yielded as soon as its API call returns so callers
+        can overlap downstream work (e.g. chunk inserts) with the calls
+        still in flight.
+
+        Args:
+            texts: List of texts to embed
+            batch_size: Maximum number of texts per API request
+
+        Yields:
+            Tuples of (offset into texts, embeddings for that batch)
+        """
+        batches = _pack_batches(texts, batch_size)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        loop = asyncio.get_running_loop()
+        completed = 0
+
+        async def embed_batch(offset: int, batch: List[str]):
+            nonlocal completed
+            async with semaphore:
+                try:
+                    result = await loop.run_in_executor(
+                        self._pool,
+                        lambda: _genai().embed_content(content=batch, **self._doc_kwargs)
+                    )
+                    completed += len(batch)
+                    logger.info(f"Generated embeddings: {completed}/{len(texts)}")
+                    return offset, result['embedding']
+
+                except Exception as e:
+                    logger.error(f"Error embedding batch at offset {offset}: {e}")
+                    raise
+
+        offsets = []
+        offset = 0
+        for batch in batches:
+            offsets.append(offset)
+            offset += len(batch)
+
+        tasks = [
+            asyncio.ensure_future(embed_batch(batch_offset, batch))
+            for batch_offset, batch in zip(offsets, batches)
+        ]
+        for task in asyncio.as_completed(tasks):
+            yield await task
+
     async def generate_batch_embeddings(
         self,
         texts: List[str],
-        delay_ms: int = 100
+        batch_size: int = 100
     ) -> List[List[float]]:
         """
-        Generate embeddings for multiple texts with rate limiting
+        Generate embeddings for multiple texts using batched API calls
+
+        Thin collector over stream_batch_embeddings for callers that need
+        the full list in input order.
 
         Args:
             texts: List of texts to embed
-            delay_ms: Delay between requests in milliseconds
+            batch_size: Maximum number of texts per API request
 
         Returns:
             List of embedding vectors
         """
-        embeddings = []
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        async for offset, batch_embeddings in self.stream_batch_embeddings(texts, batch_size):
+            embeddings[offset:offset + len(batch_embeddings)] = batch_embeddings
+
+        logger.info(f"Successfully generated {len(embeddings)} embeddings")
+        return embeddings
+
+
+class BatchingQueryEmbedder:
+    """Coalesces concurrent query embeddings into single batched API calls
+
+    Concurrent /query requests each need one query embedding; instead of
+    issuing one Gemini call per request, queries arriving within a short
+    window are drained from a queue and embedded with a single batched
+    embed_content call. Callers await a future resolved by the dispatcher.
+    """
+
+    def __init__(
+        self,
+        embedding_service: EmbeddingService,
+        max_batch: int = 32,
+        max_wait_ms: int = 10
+    ):
+        """
+        Initialize the batching embedder
 
-        for i, text in enumerate(texts):
+        Args:
+            embedding_service: Service used to issue the batched embed calls
+            max_batch: Maximum number of queries per batched API call
+            max_wait_ms: Maximum time to wait for the batch to fill
+        """
+        self.embedding_service = embedding_service
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start the dispatcher task (called from application startup)"""
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch_loop())
+            logger.info(
+                f"BatchingQueryEmbedder started (max_batch={self.max_batch}, "
+                f"max_wait_ms={self.max_wait_ms})"
+            )
+
+    async def stop(self) -> None:
+        """Stop the dispatcher task (called from application shutdown)"""
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
             try:
-                embedding = await self.generate_embedding(text)
-                embeddings.append(embedding)
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
 
-                # Log progress
-                if (i + 1) % 10 == 0:
-                    logger.info(f"Generated embeddings: {i + 1}/{len(texts)}")
+    async def embed(self, query: str) -> List[float]:
+        """
+        Get the embedding for a query, batching with concurrent callers
 
-                # Rate limiting
-                if i < len(texts) - 1:
-                    await asyncio.sleep(delay_ms / 1000)
+        Falls back to a direct embed call when the dispatcher is not
+        running (scripts, tests).
 
-            except Exception as e:
-                logger.error(f"Error embedding text {i}: {e}")
-                raise
+        Args:
+            query: Search query text
 
-        logger.info(f"Successfully generated {len(embeddings)} embeddings")
-        return embeddings
+        Returns:
+            List of floats representing the embedding vector
+        """
+        cache_key = query.strip().lower()
+        cached = _QUERY_EMBED_CACHE.get(cache_key)
+        if cached is not None:
+            return list(cached)
+
+        if self._dispatcher is None:
+            return await self.embedding_service.generate_query_embedding(query)
 
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        await self._queue.put((query, future))
+        embedding = await future
+        _QUERY_EMBED_CACHE[cache_key] = tuple(embedding)
+        return embedding
 
-# Singleton instance
-_embedding_service: EmbeddingService = None
+    async def _dispatch_loop(self) -> None:
+        """Drain queued queries into batches and resolve their futures"""
+        loop = asyncio.get_running_loop()
 
+        while True:
+            batch: List[Tuple[str, asyncio.Future]] = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait_ms / 1000
 
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            await self._embed_batch(batch)
+
+    async def _embed_batch(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        """Embed a batch of queries with one API call and resolve futures"""
+        queries = [query for query, _ in batch]
+
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(
+                self.embedding_service._pool,
+                lambda: _genai().embed_content(
+                    content=queries,
+                    **self.embedding_service._query_kwargs
+                )
+            )
+            if len(batch) > 1:
+                logger.info(f"Embedded {len(batch)} concurrent queries in one call")
+
+            for (_, future), embedding in zip(batch, result['embedding']):
+                if not future.done():
+                    future.set_result(embedding)
+
+        except Exception as e:
+            logger.error(f"Error embedding query batch: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+
+@lru_cache()
 def get_embedding_service() -> EmbeddingService:
     """Get singleton embedding service instance"""
-    global _embedding_service
-    if _embedding_service is None:
-        _embedding_service = EmbeddingService()
-    return _embedding_service
+    return EmbeddingService()
+
+
+@lru_cache()
+def get_query_embedder() -> BatchingQueryEmbedder:
+    """Get singleton batching query embedder instance"""
+    return BatchingQueryEmbedder(
+        get_embedding_service(),
+        max_batch=settings.RAG_EMBED_MAX_BATCH,
+        max_wait_ms=settings.RAG_EMBED_MAX_WAIT_MS
+    )
@@ -2,33 +2,489 @@
 RAG (Retrieval Augmented Generation) service
 Handles query processing and answer generation using vector similarity search
 """
-import google.generativeai as genai
-from typing import List, Dict, Any, Optional
+import numpy as np
+from typing import AsyncIterator, Final, List, Dict, Any, Optional, Set, Tuple
+import asyncio
+import json
 import logging
+import re
+import time
+from datetime import timedelta
+from cachetools import LRUCache
 from app.core.config import settings
-from app.utils.supabase_client import supabase
-from app.services.embedding_service import get_embedding_service
+from app.utils.supabase_client import get_async_supabase_client, get_pg_pool
+from app.services.embedding_service import configure_genai, get_embedding_service, get_query_embedder
 from app.models.schemas import QueryResponse
 
 logger = logging.getLogger(__name__)
 
 
+class _ErrorSampleFilter(logging.Filter):
+    """
+    Collapse repeated identical error logs to at most one per second
+
+    During a sustained upstream outage (Gemini or Supabase down) every
+    request fails the same way; formatting and writing the same traceback
+    per request turns logging itself into the bottleneck. The first
+    occurrence goes through with its traceback, repeats within the window
+    are dropped.
+    """
+    _WINDOW_SECONDS = 1.0
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._last_seen: Dict[int, float] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.ERROR:
+            return True
+        fingerprint = hash(record.getMessage()[:96])
+        now = time.monotonic()
+        last = self._last_seen.get(fingerprint)
+        if last is not None and now - last < self._WINDOW_SECONDS:
+            return False
+        if len(self._last_seen) > 256:
+            self._last_seen.clear()
+        self._last_seen[fingerprint] = now
+        return True
+
+
+logger.addFilter(_ErrorSampleFilter())
+
+
+def _sse_event(payload: Dict[str, Any]) -> str:
+    """Format a payload as a server-sent event frame"""
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+# Static response fragments built once at import; these carry no per-request
+# interpolation, so rebuilding them on every call only costs allocations
+NO_RESULTS_HTML: Final[str] = (
+    "<p>Lo siento, no encontré información específica en mis documentos sobre tu consulta.</p>"
+    "<p>Si tu pregunta está relacionada con trámites municipales, te recomiendo:</p>"
+    "<ul><li>Reformular tu pregunta de manera más específica</li>"
+    "<li>Contactar directamente con la municipalidad</li>"
+    "<li>Verificar que la información esté disponible en los documentos cargados</li></ul>"
+)
+
+ERROR_HTML: Final[str] = '<p class="text-red-600">Ocurrió un error interno al procesar tu solicitud.</p>'
+
+# Command keywords, one tuple per response bucket; table order is priority
+# order when a query matches several buckets
+HELP_KEYWORDS: Final[tuple] = ('ayuda', 'ayúdame', 'qué puedes hacer', 'que puedes hacer',
+                               'qué temas', 'que temas', 'sobre qué', 'sobre que',
+                               'de qué', 'de que', 'help', 'opciones', 'menú', 'menu')
+FAQ_KEYWORDS: Final[tuple] = ('faq', 'preguntas frecuentes', 'consultas frecuentes')
+RAG_HELP_KEYWORDS: Final[tuple] = ('ayuda con el rag', 'como preguntar', 'cómo preguntar',
+                                   'mejores preguntas')
+TOPICS_KEYWORDS: Final[tuple] = ('temas disponibles', 'temas que manejas', 'sobre qué sabes')
+
+# Static generation instructions, identical on every request. Kept in one
+# constant so they can be registered with Gemini's explicit context cache
+# (and, failing that, form a byte-identical prefix for implicit caching).
+# Keep ALL fixed text here, ahead of the dynamic tail: providers reuse
+# their KV cache only up to the first differing byte, so anything static
+# placed after {context} is re-prefilled on every single call
+_PROMPT_PREFIX: Final[str] = """Eres un asistente virtual experto en trámites de la Municipalidad de Carabayllo.
+Tu objetivo es ayudar a los ciudadanos a entender los procedimientos y requisitos para realizar trámites municipales.
+
+IMPORTANTE: SOLO puedes responder preguntas relacionadas con trámites municipales, licencias, permisos, ordenanzas y procedimientos del municipio.
+
+Analiza la pregunta del usuario:
+1. Si la pregunta NO está relacionada con trámites municipales (por ejemplo: matemáticas, recetas de cocina, deportes, entretenimiento, etc.), responde:
+   "<p>Lo siento, solo puedo ayudarte con consultas relacionadas a <strong>trámites municipales</strong>. Por favor, pregúntame sobre licencias, permisos, requisitos o procedimientos del municipio.</p>"
+
+2. Si la pregunta SÍ está relacionada con trámites municipales, responde basándote ÚNICAMENTE en el contexto proporcionado.
+
+INSTRUCCIONES PARA RESPUESTAS VÁLIDAS:
+- Usa un lenguaje claro y amigable
+- Estructura la respuesta con HTML simple (párrafos <p>, listas <ul>, <ol>, negrita <strong>)
+- Si la información no está en el contexto, indica claramente que no tienes esa información
+- Menciona los documentos fuente cuando sea relevante
+- Si hay pasos o requisitos, preséntalos en una lista ordenada"""
+
+_PROMPT_TAIL_TEMPLATE: Final[str] = """CONTEXTO DE DOCUMENTOS MUNICIPALES:
+{context}
+
+PREGUNTA DEL USUARIO: {query}
+
+RESPUESTA:"""
+
+# Static command HTML, parsed exactly once at import; the QueryResponse
+# singletons below make a static hit a pure pointer return
+HELP_HTML: Final[str] = """
+                <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 20px; border-radius: 10px; color: white; margin-bottom: 15px;">
+                    <h2 style="margin: 0 0 10px 0; font-size: 24px;">Asistente de Trámites Municipales</h2>
+                    <p style="margin: 0; opacity: 0.9;">Tu guía inteligente para procedimientos del municipio</p>
+                </div>
+
+                <p><strong>📋 CONSULTAS FRECUENTES</strong></p>
+                <p>Haz clic o escribe una de estas opciones para obtener ayuda rápida:</p>
+
+                <div style="display: grid; gap: 10px; margin: 15px 0;">
+                    <div style="background: #f0f9ff; padding: 12px; border-radius: 8px; border-left: 4px solid #3b82f6;">
+                        <strong>1️⃣ Preguntas Frecuentes - Preguntas Frecuentes</strong><br/>
+                        <em style="color: #64748b;">Consultas más comunes sobre trámites</em>
+                    </div>
+
+                    <div style="background: #fef3c7; padding: 12px; border-radius: 8px; border-left: 4px solid #f59e0b;">
+                        <strong>2️⃣ Ayuda con el RAG</strong><br/>
+                        <em style="color: #64748b;">Aprende a hacer mejores preguntas</em>
+                    </div>
+
+                    <div style="background: #f0fdf4; padding: 12px; border-radius: 8px; border-left: 4px solid #10b981;">
+                        <strong>3️⃣ Temas disponibles</strong><br/>
+                        <em style="color: #64748b;">Lista de todos los temas que manejo</em>
+                    </div>
+                </div>
+
+                <p style="margin-top: 20px;"><strong>💡 Ejemplos de preguntas directas:</strong></p>
+                <ul style="line-height: 1.8;">
+                    <li>"¿Cómo saco una licencia de funcionamiento para una bodega?"</li>
+                    <li>"¿Qué requisitos necesito para comercio ambulatorio?"</li>
+                    <li>"¿Cuánto cuesta una licencia provisional?"</li>
+                    <li>"¿Dónde descargo el formato de solicitud?"</li>
+                </ul>
+
+                <p style="background: #fef2f2; padding: 10px; border-radius: 6px; border-left: 3px solid #ef4444;">
+                    ⚠️ <strong>Importante:</strong> Solo puedo responder preguntas sobre trámites municipales basándome en los documentos oficiales cargados.
+                </p>
+                """
+
+FAQ_HTML: Final[str] = """
+                <h3 style="color: #3b82f6; margin-bottom: 15px;">Preguntas Frecuentes</h3>
+
+                <details style="margin-bottom: 15px; padding: 12px; background: #f8fafc; border-radius: 8px;">
+                    <summary style="cursor: pointer; font-weight: bold; color: #1e40af;">¿Qué tipos de licencias puedo solicitar?</summary>
+                    <p style="margin-top: 10px; padding-left: 10px;">Puedes solicitar licencias de funcionamiento (bodegas, restaurantes, comercios), permisos de construcción, autorizaciones de comercio ambulatorio, y más. Pregúntame específicamente sobre el tipo que necesitas.</p>
+                </details>
+
+                <details style="margin-bottom: 15px; padding: 12px; background: #f8fafc; border-radius: 8px;">
+                    <summary style="cursor: pointer; font-weight: bold; color: #1e40af;">¿Cuánto demora una licencia de funcionamiento?</summary>
+                    <p style="margin-top: 10px; padding-left: 10px;">Los tiempos varían según el tipo de licencia. Pregúntame específicamente sobre la licencia que necesitas para darte información precisa sobre plazos.</p>
+                </details>
+
+                <details style="margin-bottom: 15px; padding: 12px; background: #f8fafc; border-radius: 8px;">
+                    <summary style="cursor: pointer; font-weight: bold; color: #1e40af;">¿Qué documentos necesito presentar?</summary>
+                    <p style="margin-top: 10px; padding-left: 10px;">Los requisitos dependen del trámite. Pregúntame sobre el trámite específico (ejemplo: "requisitos para licencia de bodega") para obtener la lista completa.</p>
+                </details>
+
+                <details style="margin-bottom: 15px; padding: 12px; background: #f8fafc; border-radius: 8px;">
+                    <summary style="cursor: pointer; font-weight: bold; color: #1e40af;">¿Dónde descargo los formularios?</summary>
+                    <p style="margin-top: 10px; padding-left: 10px;">Pregúntame sobre el formulario específico que necesitas (ejemplo: "formato de licencia de bodega") y te indicaré dónde encontrarlo.</p>
+                </details>
+
+                <details style="margin-bottom: 15px; padding: 12px; background: #f8fafc; border-radius: 8px;">
+                    <summary style="cursor: pointer; font-weight: bold; color: #1e40af;">¿Cuáles son los costos de los trámites?</summary>
+                    <p style="margin-top: 10px; padding-left: 10px;">Los costos varían según el tipo de trámite y categoría. Consulta específicamente sobre el trámite que te interesa.</p>
+                </details>
+
+                <p style="margin-top: 20px; padding: 12px; background: #dbeafe; border-radius: 8px;">
+                    <strong>💬 ¿No encontraste tu pregunta?</strong><br/>
+                    Escríbela directamente y te ayudaré con la información disponible.
+                </p>
+                """
+
+RAG_HELP_HTML: Final[str] = """
+                <h3 style="color: #f59e0b; margin-bottom: 15px;">🤖 Cómo usar el Asistente RAG</h3>
+
+                <div style="background: #fffbeb; padding: 15px; border-radius: 8px; border-left: 4px solid #f59e0b; margin-bottom: 15px;">
+                    <strong>¿Qué es RAG?</strong>
+                    <p>RAG (Retrieval Augmented Generation) significa que busco información en documentos oficiales y genero respuestas basadas en esos datos reales.</p>
+                </div>
+
+                <h4 style="color: #10b981; margin-top: 20px;">✅ Consejos para mejores resultados:</h4>
+
+                <div style="background: #f0fdf4; padding: 12px; border-radius: 8px; margin: 10px 0;">
+                    <strong>1. Sé específico</strong>
+                    <ul>
+                        <li>❌ Malo: "Necesito una licencia"</li>
+                        <li>✅ Bueno: "¿Qué requisitos necesito para una licencia de bodega?"</li>
+                    </ul>
+                </div>
+
+                <div style="background: #f0fdf4; padding: 12px; border-radius: 8px; margin: 10px 0;">
+                    <strong>2. Usa palabras clave relacionadas</strong>
+                    <ul>
+                        <li>✅ "licencia", "permiso", "requisitos", "formulario", "trámite"</li>
+                        <li>✅ "bodega", "restaurante", "comercio", "ambulante"</li>
+                    </ul>
+                </div>
+
+                <div style="background: #f0fdf4; padding: 12px; border-radius: 8px; margin: 10px 0;">
+                    <strong>3. Haz preguntas directas</strong>
+                    <ul>
+                        <li>✅ "¿Cómo saco...?"</li>
+                        <li>✅ "¿Qué necesito para...?"</li>
+                        <li>✅ "¿Cuánto cuesta...?"</li>
+                        <li>✅ "¿Dónde encuentro...?"</li>
+                    </ul>
+                </div>
+
+                <div style="background: #f0fdf4; padding: 12px; border-radius: 8px; margin: 10px 0;">
+                    <strong>4. Una pregunta a la vez</strong>
+                    <ul>
+                        <li>❌ Malo: "¿Cómo saco licencia, cuánto cuesta y dónde la tramito?"</li>
+                        <li>✅ Bueno: "¿Cómo saco una licencia de funcionamiento?" (luego pregunta el costo)</li>
+                    </ul>
+                </div>
+
+                <h4 style="color: #ef4444; margin-top: 20px;">❌ Lo que NO puedo hacer:</h4>
+                <ul style="background: #fef2f2; padding: 15px; border-radius: 8px;">
+                    <li>Responder preguntas fuera del ámbito municipal</li>
+                    <li>Inventar información que no esté en los documentos</li>
+                    <li>Procesar solicitudes o trámites directamente</li>
+                    <li>Acceder a información personal o expedientes</li>
+                </ul>
+
+                <div style="background: #dbeafe; padding: 15px; border-radius: 8px; margin-top: 20px;">
+                    <strong>💡 Tip Pro:</strong> Si no obtienes una buena respuesta, reformula tu pregunta de manera más específica o usa sinónimos.
+                </div>
+                """
+
+TOPICS_HTML: Final[str] = """
+                <h3 style="color: #10b981; margin-bottom: 15px;">📚 Temas Disponibles</h3>
+
+                <div style="display: grid; gap: 12px;">
+                    <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 15px; border-radius: 8px; color: white;">
+                        <strong style="font-size: 18px;">🏪 Licencias de Funcionamiento</strong>
+                        <ul style="margin: 10px 0 0 20px; opacity: 0.95;">
+                            <li>Licencias para bodegas</li>
+                            <li>Licencias para restaurantes</li>
+                            <li>Licencias para comercios en general</li>
+                            <li>Licencias provisionales</li>
+                        </ul>
+                    </div>
+
+                    <div style="background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%); padding: 15px; border-radius: 8px; color: white;">
+                        <strong style="font-size: 18px;">🛒 Comercio y Permisos</strong>
+                        <ul style="margin: 10px 0 0 20px; opacity: 0.95;">
+                            <li>Autorización de comercio ambulatorio</li>
+                            <li>Permisos de eventos</li>
+                            <li>Ocupación de vía pública</li>
+                        </ul>
+                    </div>
+
+                    <div style="background: linear-gradient(135deg, #4facfe 0%, #00f2fe 100%); padding: 15px; border-radius: 8px; color: white;">
+                        <strong style="font-size: 18px;">📋 Documentación y Requisitos</strong>
+                        <ul style="margin: 10px 0 0 20px; opacity: 0.95;">
+                            <li>Formularios oficiales</li>
+                            <li>Requisitos por tipo de trámite</li>
+                            <li>Documentos necesarios</li>
+                        </ul>
+                    </div>
+
+                    <div style="background: linear-gradient(135deg, #fa709a 0%, #fee140 100%); padding: 15px; border-radius: 8px; color: white;">
+                        <strong style="font-size: 18px;">⚖️ Normativa Legal</strong>
+                        <ul style="margin: 10px 0 0 20px; opacity: 0.95;">
+                            <li>Ordenanzas municipales</li>
+                            <li>Leyes aplicables</li>
+                            <li>Decretos y reglamentos</li>
+                        </ul>
+                    </div>
+
+                    <div style="background: linear-gradient(135deg, #a8edea 0%, #fed6e3 100%); padding: 15px; border-radius: 8px; color: #1f2937;">
+                        <strong style="font-size: 18px;">⏱️ Procedimientos Administrativos</strong>
+                        <ul style="margin: 10px 0 0 20px;">
+                            <li>Plazos de aprobación</li>
+                            <li>Costos y tasas</li>
+                            <li>Pasos del trámite</li>
+                        </ul>
+                    </div>
+                </div>
+
+                <p style="margin-top: 20px; padding: 15px; background: #fef3c7; border-radius: 8px; border-left: 4px solid #f59e0b;">
+                    <strong>📌 Nota:</strong> La información disponible depende de los documentos oficiales que han sido cargados al sistema. Si no encuentro información sobre un tema, te lo indicaré.
+                </p>
+                """
+
+# Attribute patterns for the generative-cache tagger; a query matching one
+# of these plus a known trámite keyword is answerable straight from the
+# precomputed (trámite, attribute) grid (see sql/generative_cache.sql and
+# app/scripts/warm_generative_cache.py)
+_ATTRIBUTE_RES: Final[dict] = {
+    'requisitos': re.compile(r'requisito|documento|necesito'),
+    'costo': re.compile(r'cuesta|costo|precio|tasa|pagar'),
+    'plazo': re.compile(r'plazo|demora|tarda|cuánto tiempo|cuanto tiempo'),
+    'formulario': re.compile(r'formulario|formato|descarg'),
+}
+
+# (label, keywords, response) dispatch table; order is match priority
+_STATIC_COMMANDS: Final[list] = [
+    ('HELP', HELP_KEYWORDS, QueryResponse(
+        answer=HELP_HTML, document_name="Sistema de Ayuda", sources=[]
+    )),
+    ('FAQ', FAQ_KEYWORDS, QueryResponse(
+        answer=FAQ_HTML, document_name="Preguntas Frecuentes", sources=[]
+    )),
+    ('RAG_HELP', RAG_HELP_KEYWORDS, QueryResponse(
+        answer=RAG_HELP_HTML, document_name="Guía de Uso del RAG", sources=[]
+    )),
+    ('TOPICS', TOPICS_KEYWORDS, QueryResponse(
+        answer=TOPICS_HTML, document_name="Catálogo de Temas", sources=[]
+    )),
+]
+
+# One alternation regex over every command keyword: a single C scan of
+# the query replaces one Python-level substring pass per keyword
+_COMMAND_RE: Final = re.compile('|'.join(
+    re.escape(keyword)
+    for _, keywords, _response in _STATIC_COMMANDS
+    for keyword in keywords
+))
+_KEYWORD_BUCKET: Final[dict] = {
+    keyword: bucket
+    for bucket, (_, keywords, _response) in enumerate(_STATIC_COMMANDS)
+    for keyword in keywords
+}
+
+
+class SemanticCache:
+    """Caches full query responses keyed by embedding similarity
+
+    Near-duplicate questions ("¿cómo saco licencia de bodega?" vs "como
+    obtengo una licencia para bodega") produce embeddings with cosine
+    similarity near 1. Comparing a new query's embedding against the
+    cached ones with a single matrix-vector product lets such queries
+    skip the vector search and the multi-second Gemini call entirely.
+    Entries live in a fixed-size ring buffer, newest overwriting oldest.
+    """
+
+    def __init__(self, max_entries: int = 256, threshold: float = 0.95):
+        """
+        Initialize the semantic cache
+
+        Args:
+            max_entries: Ring buffer capacity
+            threshold: Minimum cosine similarity counted as a hit
+        """
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._matrix: Optional[np.ndarray] = None  # (capacity, dim), L2-normalized rows
+        self._responses: List[QueryResponse] = []
+        self._next_slot = 0
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> Optional[np.ndarray]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        if norm == 0.0:
+            return None
+        return vector / norm
+
+    def get(self, embedding: List[float]) -> Optional[QueryResponse]:
+        """Return the cached response most similar to `embedding`, if any
+        clears the similarity threshold"""
+        if not self._responses:
+            return None
+
+        query = self._normalize(embedding)
+        if query is None:
+            return None
+
+        scores = self._matrix[:len(self._responses)] @ query
+        best = int(np.argmax(scores))
+        if scores[best] >= self.threshold:
+            logger.info(f"[CACHE] Semantic hit (similarity: {scores[best]:.3f})")
+            return self._responses[best]
+        return None
+
+    def put(self, embedding: List[float], response: QueryResponse) -> None:
+        """Store a response under its query embedding"""
+        query = self._normalize(embedding)
+        if query is None:
+            return
+
+        if self._matrix is None:
+            self._matrix = np.zeros((self.max_entries, query.shape[0]), dtype=np.float32)
+
+        if len(self._responses) < self.max_entries:
+            self._matrix[len(self._responses)] = query
+            self._responses.append(response)
+        else:
+            self._matrix[self._next_slot] = query
+            self._responses[self._next_slot] = response
+            self._next_slot = (self._next_slot + 1) % self.max_entries
+
+
 class RAGService:
     """Service for RAG-based question answering"""
 
     def __init__(self):
         """Initialize RAG service"""
-        genai.configure(api_key=settings.GEMINI_API_KEY)
+        configure_genai()
         self.embedding_service = get_embedding_service()
+        self.query_embedder = get_query_embedder()
         self.model_name = settings.GEMINI_CHAT_MODEL
+        # One GenerativeModel for the life of the service; constructing it
+        # per call threw away the SDK's warm HTTPS channel every query
+        self._uses_cached_prefix = False
+        self._model = self._build_model()
+        self.semantic_cache = SemanticCache()
+        # Exact-match layer in front of the semantic cache: repeat
+        # queries skip even the embedding lookup
+        self._exact_cache: LRUCache = LRUCache(maxsize=512)
+        # Single-flight registry: normalized query -> Future for a pipeline
+        # run already underway, awaited by identical concurrent queries
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # (trámite, attribute) -> precomputed response; loaded lazily from
+        # the generative_cache table on first query
+        self._generative_cache: Optional[Dict[Tuple[str, str], QueryResponse]] = None
+        self._tramite_keywords: List[Tuple[str, str]] = []
         logger.info(f"RAGService initialized with model: {self.model_name}")
 
-    async def query(self, query: str) -> QueryResponse:
+    def _build_model(self) -> "genai.GenerativeModel":
+        """Build the chat model, registering the static prompt prefix with
+        Gemini's explicit context cache when the API accepts it
+
+        Explicit caching stops re-billing the ~400 fixed instruction
+        tokens on every call, but the API enforces a minimum cached size
+        that small prefixes may not meet — in that case (or any other
+        failure) fall back to a plain model and let the provider's
+        implicit prefix caching do what it can.
+        """
+        # Deferred with the rest of the SDK (see embedding_service._genai)
+        # so importing this module stays cheap
+        import google.generativeai as genai
+
+        try:
+            from google.generativeai import caching
+
+            cached = caching.CachedContent.create(
+                model=self.model_name,
+                system_instruction=_PROMPT_PREFIX,
+                ttl=timedelta(hours=24)
+            )
+            self._uses_cached_prefix = True
+            logger.info("Prompt prefix registered with Gemini context cache")
+            return genai.GenerativeModel.from_cached_content(cached)
+
+        except Exception as e:
+            logger.info(f"Gemini context caching unavailable ({e}); using plain prompts")
+            self._uses_cached_prefix = False
+            return genai.GenerativeModel(self.model_name)
+
+    def _drop_cached_prefix(self) -> None:
+        """Fall back to plain prompts (e.g. after the cache TTL expired)"""
+        import google.generativeai as genai
+
+        logger.warning("Dropping expired/broken cached prefix; rebuilding plain model")
+        self._uses_cached_prefix = False
+        self._model = genai.GenerativeModel(self.model_name)
+
+    async def query(
+        self,
+        query: str,
+        query_embedding: Optional[List[float]] = None
+    ) -> QueryResponse:
         """
         Process a user query and generate an answer using RAG
 
         Args:
             query: User's question
+            query_embedding: Optional precomputed embedding for the query;
+                when omitted, the query is embedded through the shared
+                batching embedder
 
         Returns:
             QueryResponse with answer and metadata
@@ -37,233 +493,185 @@ class RAGService:
         logger.info(f"[STEP 1] User query: '{query}'")
 
         try:
-            # Detectar comandos especiales
-            query_lower = query.lower().strip()
-
-            # 1. Ayuda general
-            help_keywords = ['ayuda', 'ayúdame', 'qué puedes hacer', 'que puedes hacer',
-                           'qué temas', 'que temas', 'sobre qué', 'sobre que',
-                           'de qué', 'de que', 'help', 'opciones', 'menú', 'menu']
-
-            if any(keyword in query_lower for keyword in help_keywords):
-                logger.info("[HELP] Help message requested")
-                return QueryResponse(
-                    answer="""
-                    <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 20px; border-radius: 10px; color: white; margin-bottom: 15px;">
-                        <h2 style="margin: 0 0 10px 0; font-size: 24px;">Asistente de Trámites Municipales</h2>
-                        <p style="margin: 0; opacity: 0.9;">Tu guía inteligente para procedimientos del municipio</p>
-                    </div>
-
-                    <p><strong>📋 CONSULTAS FRECUENTES</strong></p>
-                    <p>Haz clic o escribe una de estas opciones para obtener ayuda rápida:</p>
+            # Detectar comandos especiales (casefold handles the Unicode
+            # edge cases lower() misses)
+            query_lower = query.casefold().strip()
+
+            static_response = self._check_special_commands(query_lower)
+            if static_response is not None:
+                return static_response
+
+            exact_hit = self._exact_cache.get(query_lower)
+            if exact_hit is not None:
+                logger.info("[CACHE] Exact-match hit")
+                return exact_hit
+
+            # Single-flight: concurrent identical queries ride the first
+            # one's pipeline instead of each paying for retrieval and
+            # generation — the caches above only help once one finishes
+            inflight = self._inflight.get(query_lower)
+            if inflight is not None:
+                logger.info("[CACHE] Joining identical in-flight query")
+                return await asyncio.shield(inflight)
+
+            future: asyncio.Future = asyncio.get_running_loop().create_future()
+            self._inflight[query_lower] = future
+            try:
+                response = await self._run_query(query, query_lower, query_embedding)
+            except BaseException as e:
+                future.set_exception(e)
+                future.exception()  # mark retrieved; followers get their own copy
+                raise
+            else:
+                future.set_result(response)
+                return response
+            finally:
+                self._inflight.pop(query_lower, None)
 
-                    <div style="display: grid; gap: 10px; margin: 15px 0;">
-                        <div style="background: #f0f9ff; padding: 12px; border-radius: 8px; border-left: 4px solid #3b82f6;">
-                            <strong>1️⃣ Preguntas Frecuentes - Preguntas Frecuentes</strong><br/>
-                            <em style="color: #64748b;">Consultas más comunes sobre trámites</em>
-                        </div>
+        except Exception as e:
+            logger.exception(f"[ERROR] RAG query failed: {e}")
+            return QueryResponse(
+                answer=ERROR_HTML,
+                document_name="",
+                sources=[]
+            )
 
-                        <div style="background: #fef3c7; padding: 12px; border-radius: 8px; border-left: 4px solid #f59e0b;">
-                            <strong>2️⃣ Ayuda con el RAG</strong><br/>
-                            <em style="color: #64748b;">Aprende a hacer mejores preguntas</em>
-                        </div>
+    async def _run_query(
+        self,
+        query: str,
+        query_lower: str,
+        query_embedding: Optional[List[float]],
+        skip_caches: bool = False
+    ) -> QueryResponse:
+        """
+        Run the retrieve-and-generate pipeline for a single query
 
-                        <div style="background: #f0fdf4; padding: 12px; border-radius: 8px; border-left: 4px solid #10b981;">
-                            <strong>3️⃣ Temas disponibles</strong><br/>
-                            <em style="color: #64748b;">Lista de todos los temas que manejo</em>
-                        </div>
-                    </div>
+        Called under the single-flight guard in `query`, which owns the
+        command/cache short-circuits and the error envelope.
 
-                    <p style="margin-top: 20px;"><strong>💡 Ejemplos de preguntas directas:</strong></p>
-                    <ul style="line-height: 1.8;">
-                        <li>"¿Cómo saco una licencia de funcionamiento para una bodega?"</li>
-                        <li>"¿Qué requisitos necesito para comercio ambulatorio?"</li>
-                        <li>"¿Cuánto cuesta una licencia provisional?"</li>
-                        <li>"¿Dónde descargo el formato de solicitud?"</li>
-                    </ul>
+        Args:
+            query: User's question
+            query_lower: Normalized form used as cache key
+            query_embedding: Optional precomputed embedding
+            skip_caches: Skip the grid lookup and semantic-cache read and
+                always run retrieval + generation; used by the warm script
+                so precomputed answers can't feed back into the grid
 
-                    <p style="background: #fef2f2; padding: 10px; border-radius: 6px; border-left: 3px solid #ef4444;">
-                        ⚠️ <strong>Importante:</strong> Solo puedo responder preguntas sobre trámites municipales basándome en los documentos oficiales cargados.
-                    </p>
-                    """,
-                    document_name="Sistema de Ayuda",
-                    sources=[]
-                )
+        Returns:
+            QueryResponse with answer and metadata
+        """
+        # 1. Generate embedding for the query (coalesced with concurrent
+        # requests), overlapped with the generative-grid lookup — an RPC
+        # on first use. Neither depends on the other, so the request only
+        # pays for the slower of the two.
+        if skip_caches:
+            grid_hit = None
+            if query_embedding is None:
+                query_embedding = await self.query_embedder.embed(query)
+        elif query_embedding is None:
+            grid_hit, query_embedding = await asyncio.gather(
+                self._generative_cache_lookup(query_lower),
+                self.query_embedder.embed(query)
+            )
+        else:
+            grid_hit = await self._generative_cache_lookup(query_lower)
+        if grid_hit is not None:
+            return grid_hit
+        logger.info(f"[STEP 2] Query embedding generated (Dimensions: {len(query_embedding)})")
+
+        # Semantically equivalent recent query? Reuse its full response
+        cached = self.semantic_cache.get(query_embedding) if not skip_caches else None
+        if cached is not None:
+            return cached
+
+        # 2. Search for similar chunks in Supabase using vector similarity
+        logger.info("[STEP 3] Searching for similar chunks in Supabase...")
+        chunks = await self._search_similar_chunks(
+            query_embedding,
+            threshold=settings.RAG_SIMILARITY_THRESHOLD,
+            limit=settings.RAG_TOP_K_RESULTS
+        )
+
+        if not chunks:
+            logger.warning("[RESULT] No relevant chunks found in database")
+            return QueryResponse(
+                answer=NO_RESULTS_HTML,
+                document_name=None,
+                sources=[]
+            )
 
-            # 2. FAQ - Preguntas Frecuentes
-            if 'faq' in query_lower or 'preguntas frecuentes' in query_lower or 'consultas frecuentes' in query_lower:
-                logger.info("[FAQ] Frequently asked questions requested")
-                return QueryResponse(
-                    answer="""
-                    <h3 style="color: #3b82f6; margin-bottom: 15px;">Preguntas Frecuentes</h3>
-
-                    <details style="margin-bottom: 15px; padding: 12px; background: #f8fafc; border-radius: 8px;">
-                        <summary style="cursor: pointer; font-weight: bold; color: #1e40af;">¿Qué tipos de licencias puedo solicitar?</summary>
-                        <p style="margin-top: 10px; padding-left: 10px;">Puedes solicitar licencias de funcionamiento (bodegas, restaurantes, comercios), permisos de construcción, autorizaciones de comercio ambulatorio, y más. Pregúntame específicamente sobre el tipo que necesitas.</p>
-                    </details>
-
-                    <details style="margin-bottom: 15px; padding: 12px; background: #f8fafc; border-radius: 8px;">
-                        <summary style="cursor: pointer; font-weight: bold; color: #1e40af;">¿Cuánto demora una licencia de funcionamiento?</summary>
-                        <p style="margin-top: 10px; padding-left: 10px;">Los tiempos varían según el tipo de licencia. Pregúntame específicamente sobre la licencia que necesitas para darte información precisa sobre plazos.</p>
-                    </details>
-
-                    <details style="margin-bottom: 15px; padding: 12px; background: #f8fafc; border-radius: 8px;">
-                        <summary style="cursor: pointer; font-weight: bold; color: #1e40af;">¿Qué documentos necesito presentar?</summary>
-                        <p style="margin-top: 10px; padding-left: 10px;">Los requisitos dependen del trámite. Pregúntame sobre el trámite específico (ejemplo: "requisitos para licencia de bodega") para obtener la lista completa.</p>
-                    </details>
-
-                    <details style="margin-bottom: 15px; padding: 12px; background: #f8fafc; border-radius: 8px;">
-                        <summary style="cursor: pointer; font-weight: bold; color: #1e40af;">¿Dónde descargo los formularios?</summary>
-                        <p style="margin-top: 10px; padding-left: 10px;">Pregúntame sobre el formulario específico que necesitas (ejemplo: "formato de licencia de bodega") y te indicaré dónde encontrarlo.</p>
-                    </details>
-
-                    <details style="margin-bottom: 15px; padding: 12px; background: #f8fafc; border-radius: 8px;">
-                        <summary style="cursor: pointer; font-weight: bold; color: #1e40af;">¿Cuáles son los costos de los trámites?</summary>
-                        <p style="margin-top: 10px; padding-left: 10px;">Los costos varían según el tipo de trámite y categoría. Consulta específicamente sobre el trámite que te interesa.</p>
-                    </details>
-
-                    <p style="margin-top: 20px; padding: 12px; background: #dbeafe; border-radius: 8px;">
-                        <strong>💬 ¿No encontraste tu pregunta?</strong><br/>
-                        Escríbela directamente y te ayudaré con la información disponible.
-                    </p>
-                    """,
-                    document_name="Preguntas Frecuentes",
-                    sources=[]
-                )
+        logger.info(f"[RESULT] Found {len(chunks)} relevant chunks")
+        logger.info(f"Most relevant document: {chunks[0].get('filename', 'Unknown')}")
 
-            # 3. Ayuda con el RAG
-            if 'ayuda con el rag' in query_lower or 'como preguntar' in query_lower or 'cómo preguntar' in query_lower or 'mejores preguntas' in query_lower:
-                logger.info("[RAG_HELP] RAG usage help requested")
-                return QueryResponse(
-                    answer="""
-                    <h3 style="color: #f59e0b; margin-bottom: 15px;">🤖 Cómo usar el Asistente RAG</h3>
+        # 3. Build context from retrieved chunks
+        context = self._build_context(chunks)
 
-                    <div style="background: #fffbeb; padding: 15px; border-radius: 8px; border-left: 4px solid #f59e0b; margin-bottom: 15px;">
-                        <strong>¿Qué es RAG?</strong>
-                        <p>RAG (Retrieval Augmented Generation) significa que busco información en documentos oficiales y genero respuestas basadas en esos datos reales.</p>
-                    </div>
+        # 4. Generate answer using Gemini
+        logger.info("[STEP 4] Generating answer with Gemini...")
+        answer = await self._generate_answer(query, context)
 
-                    <h4 style="color: #10b981; margin-top: 20px;">✅ Consejos para mejores resultados:</h4>
+        logger.info("[STEP 5] Answer generated successfully")
 
-                    <div style="background: #f0fdf4; padding: 12px; border-radius: 8px; margin: 10px 0;">
-                        <strong>1. Sé específico</strong>
-                        <ul>
-                            <li>❌ Malo: "Necesito una licencia"</li>
-                            <li>✅ Bueno: "¿Qué requisitos necesito para una licencia de bodega?"</li>
-                        </ul>
-                    </div>
+        # Extract unique source documents
+        sources = list(dict.fromkeys(
+            chunk['filename'] for chunk in chunks if chunk.get('filename')
+        ))
 
-                    <div style="background: #f0fdf4; padding: 12px; border-radius: 8px; margin: 10px 0;">
-                        <strong>2. Usa palabras clave relacionadas</strong>
-                        <ul>
-                            <li>✅ "licencia", "permiso", "requisitos", "formulario", "trámite"</li>
-                            <li>✅ "bodega", "restaurante", "comercio", "ambulante"</li>
-                        </ul>
-                    </div>
+        response = QueryResponse(
+            answer=answer,
+            document_name=chunks[0].get('filename', 'Desconocido'),
+            sources=sources
+        )
+        self.semantic_cache.put(query_embedding, response)
+        self._exact_cache[query_lower] = response
+        return response
 
-                    <div style="background: #f0fdf4; padding: 12px; border-radius: 8px; margin: 10px 0;">
-                        <strong>3. Haz preguntas directas</strong>
-                        <ul>
-                            <li>✅ "¿Cómo saco...?"</li>
-                            <li>✅ "¿Qué necesito para...?"</li>
-                            <li>✅ "¿Cuánto cuesta...?"</li>
-                            <li>✅ "¿Dónde encuentro...?"</li>
-                        </ul>
-                    </div>
-
-                    <div style="background: #f0fdf4; padding: 12px; border-radius: 8px; margin: 10px 0;">
-                        <strong>4. Una pregunta a la vez</strong>
-                        <ul>
-                            <li>❌ Malo: "¿Cómo saco licencia, cuánto cuesta y dónde la tramito?"</li>
-                            <li>✅ Bueno: "¿Cómo saco una licencia de funcionamiento?" (luego pregunta el costo)</li>
-                        </ul>
-                    </div>
+    async def query_stream(self, query: str) -> AsyncIterator[str]:
+        """
+        Process a user query and stream the answer as server-sent events
 
-                    <h4 style="color: #ef4444; margin-top: 20px;">❌ Lo que NO puedo hacer:</h4>
-                    <ul style="background: #fef2f2; padding: 15px; border-radius: 8px;">
-                        <li>Responder preguntas fuera del ámbito municipal</li>
-                        <li>Inventar información que no esté en los documentos</li>
-                        <li>Procesar solicitudes o trámites directamente</li>
-                        <li>Acceder a información personal o expedientes</li>
-                    </ul>
+        Retrieval works exactly like `query`, but the Gemini answer is
+        forwarded chunk by chunk as it is generated, so clients render the
+        first tokens without waiting for the full completion. A final
+        "metadata" event carries the source documents.
 
-                    <div style="background: #dbeafe; padding: 15px; border-radius: 8px; margin-top: 20px;">
-                        <strong>💡 Tip Pro:</strong> Si no obtienes una buena respuesta, reformula tu pregunta de manera más específica o usa sinónimos.
-                    </div>
-                    """,
-                    document_name="Guía de Uso del RAG",
-                    sources=[]
-                )
+        Args:
+            query: User's question
 
-            # 4. Temas disponibles
-            if 'temas disponibles' in query_lower or 'temas que manejas' in query_lower or 'sobre qué sabes' in query_lower:
-                logger.info("[TOPICS] Available topics requested")
-                return QueryResponse(
-                    answer="""
-                    <h3 style="color: #10b981; margin-bottom: 15px;">📚 Temas Disponibles</h3>
-
-                    <div style="display: grid; gap: 12px;">
-                        <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 15px; border-radius: 8px; color: white;">
-                            <strong style="font-size: 18px;">🏪 Licencias de Funcionamiento</strong>
-                            <ul style="margin: 10px 0 0 20px; opacity: 0.95;">
-                                <li>Licencias para bodegas</li>
-                                <li>Licencias para restaurantes</li>
-                                <li>Licencias para comercios en general</li>
-                                <li>Licencias provisionales</li>
-                            </ul>
-                        </div>
-
-                        <div style="background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%); padding: 15px; border-radius: 8px; color: white;">
-                            <strong style="font-size: 18px;">🛒 Comercio y Permisos</strong>
-                            <ul style="margin: 10px 0 0 20px; opacity: 0.95;">
-                                <li>Autorización de comercio ambulatorio</li>
-                                <li>Permisos de eventos</li>
-                                <li>Ocupación de vía pública</li>
-                            </ul>
-                        </div>
-
-                        <div style="background: linear-gradient(135deg, #4facfe 0%, #00f2fe 100%); padding: 15px; border-radius: 8px; color: white;">
-                            <strong style="font-size: 18px;">📋 Documentación y Requisitos</strong>
-                            <ul style="margin: 10px 0 0 20px; opacity: 0.95;">
-                                <li>Formularios oficiales</li>
-                                <li>Requisitos por tipo de trámite</li>
-                                <li>Documentos necesarios</li>
-                            </ul>
-                        </div>
-
-                        <div style="background: linear-gradient(135deg, #fa709a 0%, #fee140 100%); padding: 15px; border-radius: 8px; color: white;">
-                            <strong style="font-size: 18px;">⚖️ Normativa Legal</strong>
-                            <ul style="margin: 10px 0 0 20px; opacity: 0.95;">
-                                <li>Ordenanzas municipales</li>
-                                <li>Leyes aplicables</li>
-                                <li>Decretos y reglamentos</li>
-                            </ul>
-                        </div>
-
-                        <div style="background: linear-gradient(135deg, #a8edea 0%, #fed6e3 100%); padding: 15px; border-radius: 8px; color: #1f2937;">
-                            <strong style="font-size: 18px;">⏱️ Procedimientos Administrativos</strong>
-                            <ul style="margin: 10px 0 0 20px;">
-                                <li>Plazos de aprobación</li>
-                                <li>Costos y tasas</li>
-                                <li>Pasos del trámite</li>
-                            </ul>
-                        </div>
-                    </div>
+        Yields:
+            SSE-formatted event strings
+        """
+        logger.info(f"[STREAM] User query: '{query}'")
 
-                    <p style="margin-top: 20px; padding: 15px; background: #fef3c7; border-radius: 8px; border-left: 4px solid #f59e0b;">
-                        <strong>📌 Nota:</strong> La información disponible depende de los documentos oficiales que han sido cargados al sistema. Si no encuentro información sobre un tema, te lo indicaré.
-                    </p>
-                    """,
-                    document_name="Catálogo de Temas",
-                    sources=[]
+        try:
+            query_lower = query.casefold().strip()
+
+            static_response = self._check_special_commands(query_lower)
+            if static_response is None:
+                # Grid lookup and embedding are independent; overlap them
+                static_response, query_embedding = await asyncio.gather(
+                    self._generative_cache_lookup(query_lower),
+                    self.query_embedder.embed(query)
                 )
+            if static_response is not None:
+                yield _sse_event({"type": "chunk", "text": static_response.answer})
+                yield _sse_event({
+                    "type": "metadata",
+                    "document_name": static_response.document_name,
+                    "sources": static_response.sources
+                })
+                return
+
+            cached = self.semantic_cache.get(query_embedding)
+            if cached is not None:
+                yield _sse_event({"type": "chunk", "text": cached.answer})
+                yield _sse_event({
+                    "type": "metadata",
+                    "document_name": cached.document_name,
+                    "sources": cached.sources
+                })
+                return
 
-            # 1. Generate embedding for the query
-            query_embedding = await self.embedding_service.generate_query_embedding(query)
-            logger.info(f"[STEP 2] Query embedding generated (Dimensions: {len(query_embedding)})")
-
-            # 2. Search for similar chunks in Supabase using vector similarity
-            logger.info("[STEP 3] Searching for similar chunks in Supabase...")
             chunks = await self._search_similar_chunks(
                 query_embedding,
                 threshold=settings.RAG_SIMILARITY_THRESHOLD,
@@ -271,41 +679,135 @@ class RAGService:
             )
 
             if not chunks:
-                logger.warning("[RESULT] No relevant chunks found in database")
-                return QueryResponse(
-                    answer="<p>Lo siento, no encontré información específica en mis documentos sobre tu consulta.</p><p>Si tu pregunta está relacionada con trámites municipales, te recomiendo:</p><ul><li>Reformular tu pregunta de manera más específica</li><li>Contactar directamente con la municipalidad</li><li>Verificar que la información esté disponible en los documentos cargados</li></ul>",
-                    document_name=None,
-                    sources=[]
-                )
-
-            logger.info(f"[RESULT] Found {len(chunks)} relevant chunks")
-            logger.info(f"Most relevant document: {chunks[0].get('filename', 'Unknown')}")
+                yield _sse_event({"type": "chunk", "text": NO_RESULTS_HTML})
+                yield _sse_event({"type": "metadata", "document_name": None, "sources": []})
+                return
 
-            # 3. Build context from retrieved chunks
             context = self._build_context(chunks)
+            sources = list(dict.fromkeys(
+                chunk['filename'] for chunk in chunks if chunk.get('filename')
+            ))
+
+            # Accumulate the streamed pieces so the finished answer feeds
+            # the caches just like the non-streaming path
+            answer_parts: List[str] = []
+            async for text in self._generate_answer_stream(query, context):
+                answer_parts.append(text)
+                yield _sse_event({"type": "chunk", "text": text})
+
+            yield _sse_event({
+                "type": "metadata",
+                "document_name": chunks[0].get('filename', 'Desconocido'),
+                "sources": sources
+            })
+
+            response = QueryResponse(
+                answer=''.join(answer_parts),
+                document_name=chunks[0].get('filename', 'Desconocido'),
+                sources=sources
+            )
+            self.semantic_cache.put(query_embedding, response)
+            self._exact_cache[query_lower] = response
 
-            # 4. Generate answer using Gemini
-            logger.info("[STEP 4] Generating answer with Gemini...")
-            answer = await self._generate_answer(query, context)
+        except Exception as e:
+            logger.exception(f"[ERROR] RAG stream query failed: {e}")
+            yield _sse_event({
+                "type": "error",
+                "text": ERROR_HTML
+            })
+
+    def _check_special_commands(self, query_lower: str) -> Optional[QueryResponse]:
+        """
+        Return a static response for help/FAQ/topics commands, if any
 
-            logger.info("[STEP 5] Answer generated successfully")
+        Args:
+            query_lower: Lowercased, stripped user query
 
-            # Extract unique source documents
-            sources = list(set([chunk.get('filename') for chunk in chunks if chunk.get('filename')]))
+        Returns:
+            QueryResponse for the matched command, or None
+        """
+        best_bucket = None
+        for match in _COMMAND_RE.finditer(query_lower):
+            bucket = _KEYWORD_BUCKET[match.group()]
+            if best_bucket is None or bucket < best_bucket:
+                best_bucket = bucket
+                if bucket == 0:
+                    break
+
+        if best_bucket is None:
+            return None
+
+        label, _, response = _STATIC_COMMANDS[best_bucket]
+        logger.info(f"[{label}] Static command response")
+        return response
+
+    async def _generative_cache_lookup(self, query_lower: str) -> Optional[QueryResponse]:
+        """
+        Serve a precomputed (trámite, attribute) answer if one applies
 
-            return QueryResponse(
-                answer=answer,
-                document_name=chunks[0].get('filename', 'Desconocido'),
-                sources=sources
-            )
+        Args:
+            query_lower: Normalized user query
 
+        Returns:
+            Cached QueryResponse, or None when the query doesn't classify
+        """
+        if self._generative_cache is None:
+            await self._load_generative_cache()
+        if not self._generative_cache:
+            return None
+
+        attribute = next(
+            (name for name, pattern in _ATTRIBUTE_RES.items() if pattern.search(query_lower)),
+            None
+        )
+        if attribute is None:
+            return None
+
+        for keyword, tramite in self._tramite_keywords:
+            if keyword in query_lower:
+                response = self._generative_cache.get((tramite, attribute))
+                if response is not None:
+                    logger.info(f"[CACHE] Generative grid hit: {tramite}/{attribute}")
+                    return response
+        return None
+
+    async def _load_generative_cache(self) -> None:
+        """Load the precomputed answer grid; empty when the table is
+        missing or has not been warmed"""
+        self._generative_cache = {}
+        try:
+            db = await get_async_supabase_client()
+            response = await db.table('generative_cache').select(
+                'tramite, attribute, keywords, answer_html, document_name, sources'
+            ).execute()
         except Exception as e:
-            logger.error(f"[ERROR] RAG query failed: {e}", exc_info=True)
-            return QueryResponse(
-                answer='<p class="text-red-600">Ocurrió un error interno al procesar tu solicitud.</p>',
-                document_name="",
-                sources=[]
+            logger.info(f"Generative cache unavailable: {e}")
+            return
+
+        keyword_owners: Dict[str, Set[str]] = {}
+        for row in response.data or []:
+            self._generative_cache[(row['tramite'], row['attribute'])] = QueryResponse(
+                answer=row['answer_html'],
+                document_name=row.get('document_name'),
+                sources=row.get('sources') or []
             )
+            for keyword in row.get('keywords') or []:
+                keyword_owners.setdefault(keyword.casefold(), set()).add(row['tramite'])
+
+        # Only distinctive terms may route a query: the trámite's own name,
+        # plus keywords that belong to exactly one trámite. Generic detector
+        # keywords ('formulario', 'licencia', ...) appear in several lists
+        # and would route a query to the wrong trámite's answer.
+        tramite_names = {tramite for tramite, _ in self._generative_cache}
+        self._tramite_keywords = [(name.casefold(), name) for name in tramite_names]
+        for keyword, owners in keyword_owners.items():
+            if len(owners) == 1:
+                owner = next(iter(owners))
+                if keyword != owner.casefold():
+                    self._tramite_keywords.append((keyword, owner))
+
+        if self._generative_cache:
+            logger.info(f"Generative cache loaded: {len(self._generative_cache)} entries")
 
     async def _search_similar_chunks(
         self,
@@ -316,32 +818,115 @@ class RAGService:
         """
         Search for similar document chunks using vector similarity
 
+        The backing search_similar_chunks function runs against an HNSW
+        index (m=16, ef_construction=64, ef_search=40) and orders by
+        negative inner product over unit vectors, which equals cosine
+        similarity without the per-row norm — see
+        sql/search_similar_chunks_inner_product.sql.
+
+        ANN recall at small k is noisy, so the RPC overfetches a pool of
+        RAG_RERANK_POOL candidates (an HNSW scan at k=50 costs about the
+        same as k=5) and the exact-cosine rerank keeps only the `limit`
+        best before anything reaches the prompt.
+
+        With DATABASE_URL configured the query goes straight to Postgres
+        over asyncpg's binary protocol — the vector binds as a binary
+        blob instead of ~10 KB of JSON floats and skips the PostgREST
+        hop. Otherwise the PostgREST RPC path is used unchanged.
+
         Args:
             query_embedding: Query embedding vector
             threshold: Similarity threshold
-            limit: Maximum number of results
+            limit: Maximum number of results after reranking
 
         Returns:
             List of matching chunks with metadata
         """
         try:
-            response = supabase.rpc(
-                'search_similar_chunks',
-                {
-                    'query_embedding': query_embedding,
-                    'match_threshold': threshold,
-                    'match_count': limit
-                }
-            ).execute()
-
-            if response.data:
-                return response.data
+            # Unit-normalize so the function's inner product (<#>) equals
+            # cosine similarity against the normalized stored vectors
+            vector = np.asarray(query_embedding, dtype=np.float32)
+            norm = float(np.linalg.norm(vector)) or 1.0
+            unit = vector / norm
+            match_count = max(limit, settings.RAG_RERANK_POOL)
+
+            pool = await get_pg_pool()
+            if pool is not None:
+                async with pool.acquire() as conn:
+                    rows = await conn.fetch(
+                        'select * from search_similar_chunks($1, $2, $3)',
+                        unit, threshold, match_count
+                    )
+                data = [dict(row) for row in rows]
+            else:
+                # Async client: the event loop interleaves other requests'
+                # work during the RPC round-trip instead of blocking on it
+                db = await get_async_supabase_client()
+                response = await db.rpc(
+                    'search_similar_chunks',
+                    {
+                        'query_embedding': unit.tolist(),
+                        'match_threshold': threshold,
+                        'match_count': match_count
+                    }
+                ).execute()
+                data = response.data
+
+            if data:
+                return self._rerank_chunks(unit, data)[:limit]
             return []
 
-        except Exception as e:
-            logger.error(f"Error searching similar chunks: {e}")
+        except Exception:
+            # Logged once by the outer query handler; logging here too
+            # would double every traceback
             raise
 
+    @staticmethod
+    def _rerank_chunks(
+        query_vector: np.ndarray,
+        chunks: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Re-sort candidates by exact similarity computed in-process
+
+        HNSW ordering is approximate (bounded by ef_search); recomputing
+        the exact inner product over the returned embeddings with a single
+        matrix-vector product fixes ranking inversions at negligible cost.
+        The raw embeddings are stripped from the chunks afterwards so they
+        don't leak into the prompt context or the API response.
+
+        Args:
+            query_vector: L2-normalized query embedding
+            chunks: Candidate rows from search_similar_chunks
+
+        Returns:
+            Chunks sorted by exact similarity, highest first
+        """
+        embeddings = []
+        for chunk in chunks:
+            raw = chunk.pop('embedding', None)
+            if raw is None:
+                # Older function version without embeddings in the payload
+                return chunks
+            if isinstance(raw, str):
+                # PostgREST serializes vectors as '[f1,f2,...]' text
+                embeddings.append(
+                    np.array(raw.strip('[]').split(','), dtype=np.float32)
+                )
+            else:
+                # asyncpg + pgvector codec already yields an array
+                embeddings.append(np.asarray(raw, dtype=np.float32))
+
+        scores = np.stack(embeddings) @ query_vector
+        order = np.argsort(scores)[::-1]
+
+        reranked = []
+        for index in order:
+            chunk = chunks[int(index)]
+            chunk['similarity'] = float(scores[int(index)])
+            reranked.append(chunk)
+        return reranked
+
     def _build_context(self, chunks: List[Dict[str, Any]]) -> str:
         """
         Build context string from retrieved chunks
@@ -360,53 +945,73 @@ class RAGService:
 
         return "\n\n---\n\n".join(context_parts)
 
-    async def _generate_answer(self, query: str, context: str) -> str:
+    async def _generate_answer_stream(self, query: str, context: str) -> AsyncIterator[str]:
         """
-        Generate answer using Gemini with provided context
+        Stream answer text from Gemini as it is generated
 
         Args:
             query: User's question
             context: Retrieved context from documents
 
-        Returns:
-            Generated answer text
+        Yields:
+            Text fragments of the answer
         """
-        prompt = f"""
-Eres un asistente virtual experto en trámites de la Municipalidad de Carabayllo.
-Tu objetivo es ayudar a los ciudadanos a entender los procedimientos y requisitos para realizar trámites municipales.
-
-IMPORTANTE: SOLO puedes responder preguntas relacionadas con trámites municipales, licencias, permisos, ordenanzas y procedimientos del municipio.
-
-Analiza la pregunta del usuario:
-1. Si la pregunta NO está relacionada con trámites municipales (por ejemplo: matemáticas, recetas de cocina, deportes, entretenimiento, etc.), responde:
-   "<p>Lo siento, solo puedo ayudarte con consultas relacionadas a <strong>trámites municipales</strong>. Por favor, pregúntame sobre licencias, permisos, requisitos o procedimientos del municipio.</p>"
+        prompt = self._build_prompt(query, context)
 
-2. Si la pregunta SÍ está relacionada con trámites municipales, responde basándote ÚNICAMENTE en el contexto proporcionado.
-
-INSTRUCCIONES PARA RESPUESTAS VÁLIDAS:
-- Usa un lenguaje claro y amigable
-- Estructura la respuesta con HTML simple (párrafos <p>, listas <ul>, <ol>, negrita <strong>)
-- Si la información no está en el contexto, indica claramente que no tienes esa información
-- Menciona los documentos fuente cuando sea relevante
-- Si hay pasos o requisitos, preséntalos en una lista ordenada
+        try:
+            # The SDK iterator blocks on the network; advance it in a thread
+            response = await asyncio.to_thread(self._model.generate_content, prompt, stream=True)
+            iterator = iter(response)
+
+            while True:
+                chunk = await asyncio.to_thread(next, iterator, None)
+                if chunk is None:
+                    break
+                if chunk.text:
+                    yield chunk.text
+
+        except Exception:
+            # Logged once by the outer stream handler
+            raise
 
-CONTEXTO DE DOCUMENTOS MUNICIPALES:
-{context}
+    async def _generate_answer(self, query: str, context: str) -> str:
+        """
+        Generate answer using Gemini with provided context
 
-PREGUNTA DEL USUARIO: {query}
+        Args:
+            query: User's question
+            context: Retrieved context from documents
 
-RESPUESTA:
-""".strip()
+        Returns:
+            Generated answer text
+        """
+        prompt = self._build_prompt(query, context)
 
         try:
-            model = genai.GenerativeModel(self.model_name)
-            response = model.generate_content(prompt)
+            # The SDK call blocks on the network; keep it off the event
+            # loop so concurrent requests stay serviceable meanwhile
+            response = await asyncio.to_thread(self._model.generate_content, prompt)
             return response.text
 
         except Exception as e:
-            logger.error(f"Error generating answer with Gemini: {e}")
+            if self._uses_cached_prefix:
+                # Cached content can expire server-side; retry once plain
+                self._drop_cached_prefix()
+                return await self._generate_answer(query, context)
+            # Logged once by the outer query handler
             raise
 
+    def _build_prompt(self, query: str, context: str) -> str:
+        """Build the generation prompt from the query and retrieved context
+
+        When the static instructions are registered with Gemini's context
+        cache, only the dynamic tail is sent; otherwise the full prompt.
+        """
+        tail = _PROMPT_TAIL_TEMPLATE.format(context=context, query=query)
+        if self._uses_cached_prefix:
+            return tail
+        return f"{_PROMPT_PREFIX}\n\n{tail}"
+
 
 # Singleton instance
 _rag_service: RAGService = None
@@ -1,24 +1,43 @@
 """
 Supabase client configuration and initialization
 """
-from supabase import create_client, Client
+import httpx
 from functools import lru_cache
+from typing import Optional
 from app.core.config import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Keep-alive pool sized for a single uvicorn worker's concurrency; reusing
+# warm connections avoids a TCP+TLS handshake per Supabase call
+_POOL_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50)
+
+_async_client: Optional["AsyncClient"] = None
+
+_pg_pool = None
+_pg_pool_lock = None
+
 
 @lru_cache()
-def get_supabase_client() -> Client:
+def get_supabase_client() -> "Client":
     """
     Get cached Supabase client instance
 
     Returns:
         Client: Supabase client instance
     """
+    # Imported here so modules that only need this module's helpers don't
+    # pay for the supabase/postgrest import chain at boot
+    from supabase import create_client
+    from supabase.lib.client_options import SyncClientOptions
+
     try:
-        client = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+        client = create_client(
+            settings.SUPABASE_URL,
+            settings.SUPABASE_KEY,
+            options=SyncClientOptions(httpx_client=httpx.Client(limits=_POOL_LIMITS))
+        )
         logger.info("Supabase client initialized successfully")
         return client
     except Exception as e:
@@ -26,5 +45,81 @@ def get_supabase_client() -> Client:
         raise
 
 
-# Export singleton instance
-supabase = get_supabase_client()
+async def get_async_supabase_client() -> "AsyncClient":
+    """
+    Get cached async Supabase client instance
+
+    The async client rides httpx's pooled AsyncClient, so awaiting its
+    calls yields the event loop instead of blocking it the way the sync
+    client does. Use this from request/ingestion paths; the sync client
+    stays available for scripts.
+
+    Returns:
+        AsyncClient: Async Supabase client instance
+    """
+    from supabase import acreate_client
+    from supabase.lib.client_options import AsyncClientOptions
+
+    global _async_client
+    if _async_client is None:
+        try:
+            _async_client = await acreate_client(
+                settings.SUPABASE_URL,
+                settings.SUPABASE_KEY,
+                options=AsyncClientOptions(httpx_client=httpx.AsyncClient(limits=_POOL_LIMITS))
+            )
+            logger.info("Async Supabase client initialized successfully")
+        except Exception as e:
+            logger.error(f"Failed to initialize async Supabase client: {e}")
+            raise
+    return _async_client
+
+
+async def get_pg_pool():
+    """
+    Get the shared asyncpg pool, or None when DATABASE_URL is not set
+
+    PostgREST JSON-encodes a 768-float query vector into ~10 KB of ASCII
+    per search call; asyncpg's binary protocol ships the same vector as a
+    ~3 KB blob straight to Postgres and skips the PostgREST hop entirely.
+    pgvector's codec is registered on every pooled connection so numpy
+    arrays bind directly to vector parameters.
+
+    Returns:
+        asyncpg.Pool, or None when direct access is not configured
+    """
+    global _pg_pool, _pg_pool_lock
+    if not settings.DATABASE_URL:
+        return None
+    if _pg_pool is not None:
+        return _pg_pool
+
+    import asyncio
+    import asyncpg
+    from pgvector.asyncpg import register_vector
+
+    if _pg_pool_lock is None:
+        _pg_pool_lock = asyncio.Lock()
+    async with _pg_pool_lock:
+        if _pg_pool is None:
+            try:
+                _pg_pool = await asyncpg.create_pool(
+                    settings.DATABASE_URL,
+                    min_size=5,
+                    max_size=20,
+                    init=register_vector
+                )
+                logger.info("asyncpg pool initialized successfully")
+            except Exception as e:
+                logger.error(f"Failed to initialize asyncpg pool: {e}")
+                raise
+    return _pg_pool
+
+
+def __getattr__(name: str):
+    # Lazy module attribute (PEP 562): the exported `supabase` singleton is
+    # built on first access instead of at import time, so importing this
+    # module no longer forces a client (and httpx pool) into existence
+    if name == "supabase":
+        return get_supabase_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,16 @@
+-- Precomputed answers for the (trámite, attribute) grid filled by
+-- app/scripts/warm_generative_cache.py. keywords drives the query-time
+-- tagger in RAGService: a query matching an attribute pattern plus any
+-- keyword of a trámite is served straight from this table, skipping
+-- retrieval and generation entirely.
+create table if not exists generative_cache (
+    id uuid primary key default gen_random_uuid(),
+    tramite text not null,
+    attribute text not null,
+    keywords jsonb not null default '[]'::jsonb,
+    answer_html text not null,
+    document_name text,
+    sources jsonb not null default '[]'::jsonb,
+    created_at timestamptz not null default now(),
+    unique (tramite, attribute)
+);
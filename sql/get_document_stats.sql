@@ -0,0 +1,31 @@
+-- Aggregated document statistics computed server-side.
+-- Called from /api/rag/stats via supabase.rpc('get_document_stats');
+-- replaces three REST round-trips (documents select, chunk count,
+-- total_pages select) plus client-side aggregation with a single call.
+create or replace function get_document_stats()
+returns json
+language sql
+stable
+as $$
+    select json_build_object(
+        'total_documents', (select count(*) from documents),
+        'total_chunks', (select count(*) from document_chunks),
+        'total_pages', (select coalesce(sum(total_pages), 0) from documents),
+        'categories', (
+            select coalesce(json_object_agg(category, cnt), '{}'::json)
+            from (
+                select coalesce(category, 'unknown') as category, count(*) as cnt
+                from documents
+                group by 1
+            ) c
+        ),
+        'document_types', (
+            select coalesce(json_object_agg(document_type, cnt), '{}'::json)
+            from (
+                select coalesce(document_type, 'unknown') as document_type, count(*) as cnt
+                from documents
+                group by 1
+            ) t
+        )
+    );
+$$;
@@ -0,0 +1,28 @@
+-- Inserts a batch of chunks for a document, optionally flipping its
+-- processed flag. Called from PDFProcessor.process_pdf via
+-- supabase.rpc('insert_chunks_and_mark'); removes the separate UPDATE
+-- round-trip that used to follow the chunk insert. Batches pass the
+-- default p_mark_processed = false; the caller marks in a final call
+-- only once every batch has landed, so a failed batch never leaves a
+-- document recorded as processed with a partial chunk set.
+drop function if exists insert_chunks_and_mark(uuid, jsonb);
+
+create or replace function insert_chunks_and_mark(
+    p_document_id uuid,
+    p_chunks jsonb,
+    p_mark_processed boolean default false
+)
+returns void
+language sql
+as $$
+    insert into document_chunks (document_id, chunk_text, chunk_index, embedding, metadata)
+    select p_document_id,
+           c->>'chunk_text',
+           (c->>'chunk_index')::int,
+           (c->>'embedding')::vector,
+           c->'metadata'
+    from jsonb_array_elements(p_chunks) as c;
+
+    update documents set processed = true
+    where id = p_document_id and p_mark_processed;
+$$;
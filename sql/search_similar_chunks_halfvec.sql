@@ -0,0 +1,57 @@
+-- Switches the ANN index to half precision. Indexing the expression
+-- embedding::halfvec(768) halves index size — half the RAM, half the
+-- page-cache pressure, twice the SIMD lanes per distance call — while
+-- the table keeps the fp32 column untouched. Recall loss from fp16 is
+-- well under 1% at these dimensions, and the application reranks the
+-- candidate pool with exact fp32 cosine anyway (overfetch-then-rerank),
+-- so final ordering is unaffected.
+-- Supersedes the vector_ip_ops index from
+-- search_similar_chunks_inner_product.sql; vectors are still normalized
+-- at ingestion, so inner product remains equal to cosine similarity.
+drop index if exists idx_document_chunks_embedding_hnsw_ip;
+
+-- Guard for applying this file directly over the pre-rerank function,
+-- whose return type lacks the embedding column: CREATE OR REPLACE cannot
+-- change a function's return type (42P13). No-op when the inner-product
+-- migration already ran.
+drop function if exists search_similar_chunks(vector(768), float, int);
+
+create index if not exists idx_document_chunks_embedding_hnsw_halfvec
+    on document_chunks
+    using hnsw ((embedding::halfvec(768)) halfvec_ip_ops)
+    with (m = 16, ef_construction = 64);
+
+create or replace function search_similar_chunks(
+    query_embedding vector(768),
+    match_threshold float,
+    match_count int
+)
+returns table (
+    id uuid,
+    document_id uuid,
+    chunk_text text,
+    chunk_index int,
+    filename text,
+    similarity float,
+    embedding vector(768)
+)
+language plpgsql
+as $$
+begin
+    set local hnsw.ef_search = 40;
+
+    return query
+    select dc.id,
+           dc.document_id,
+           dc.chunk_text,
+           dc.chunk_index,
+           d.filename,
+           -(dc.embedding::halfvec(768) <#> query_embedding::halfvec(768)) as similarity,
+           dc.embedding
+    from document_chunks dc
+    join documents d on d.id = dc.document_id
+    where -(dc.embedding::halfvec(768) <#> query_embedding::halfvec(768)) > match_threshold
+    order by dc.embedding::halfvec(768) <#> query_embedding::halfvec(768) asc
+    limit match_count;
+end;
+$$;
@@ -0,0 +1,48 @@
+-- Replaces the IVFFlat index on document_chunks.embedding with HNSW and
+-- retunes search_similar_chunks to use it. HNSW gives lower tail latency
+-- and better recall at the same top-k, and needs no retraining as rows
+-- are inserted (IVFFlat lists go stale as the table grows).
+--
+-- Tuning:
+--   m = 16, ef_construction = 64  — build-time quality/size tradeoff
+--   hnsw.ef_search = 40           — candidates considered per query;
+--                                   plenty for the top-5 the API requests
+drop index if exists idx_document_chunks_embedding;
+
+create index if not exists idx_document_chunks_embedding_hnsw
+    on document_chunks
+    using hnsw (embedding vector_cosine_ops)
+    with (m = 16, ef_construction = 64);
+
+create or replace function search_similar_chunks(
+    query_embedding vector(768),
+    match_threshold float,
+    match_count int
+)
+returns table (
+    id uuid,
+    document_id uuid,
+    chunk_text text,
+    chunk_index int,
+    filename text,
+    similarity float
+)
+language plpgsql
+as $$
+begin
+    set local hnsw.ef_search = 40;
+
+    return query
+    select dc.id,
+           dc.document_id,
+           dc.chunk_text,
+           dc.chunk_index,
+           d.filename,
+           1 - (dc.embedding <=> query_embedding) as similarity
+    from document_chunks dc
+    join documents d on d.id = dc.document_id
+    where 1 - (dc.embedding <=> query_embedding) > match_threshold
+    order by dc.embedding <=> query_embedding
+    limit match_count;
+end;
+$$;
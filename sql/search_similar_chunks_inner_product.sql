@@ -0,0 +1,53 @@
+-- Switches similarity search from cosine distance (<=>) to negative inner
+-- product (<#>). The application L2-normalizes embeddings at ingestion and
+-- query time, and on unit vectors inner product equals cosine similarity —
+-- but <#> skips the per-row norm/sqrt work the cosine operator pays.
+-- Note: <#> returns the NEGATIVE inner product, so ordering must be ASC
+-- and similarity is its negation.
+-- Supersedes the vector_cosine_ops index from search_similar_chunks_hnsw.sql.
+drop index if exists idx_document_chunks_embedding_hnsw;
+
+-- The return type gains an embedding column (for the in-process rerank);
+-- CREATE OR REPLACE cannot change a function's return type (42P13), so
+-- the deployed version has to go first.
+drop function if exists search_similar_chunks(vector(768), float, int);
+
+create index if not exists idx_document_chunks_embedding_hnsw_ip
+    on document_chunks
+    using hnsw (embedding vector_ip_ops)
+    with (m = 16, ef_construction = 64);
+
+create or replace function search_similar_chunks(
+    query_embedding vector(768),
+    match_threshold float,
+    match_count int
+)
+returns table (
+    id uuid,
+    document_id uuid,
+    chunk_text text,
+    chunk_index int,
+    filename text,
+    similarity float,
+    embedding vector(768)
+)
+language plpgsql
+as $$
+begin
+    set local hnsw.ef_search = 40;
+
+    return query
+    select dc.id,
+           dc.document_id,
+           dc.chunk_text,
+           dc.chunk_index,
+           d.filename,
+           -(dc.embedding <#> query_embedding) as similarity,
+           dc.embedding
+    from document_chunks dc
+    join documents d on d.id = dc.document_id
+    where -(dc.embedding <#> query_embedding) > match_threshold
+    order by dc.embedding <#> query_embedding asc
+    limit match_count;
+end;
+$$;
@@ -0,0 +1,11 @@
+-- Empties the RAG tables in a single statement.
+-- Called from app/scripts/clear_database.py via
+-- supabase.rpc('truncate_rag_tables'); replaces the row-by-row REST
+-- DELETE (one round-trip per page of rows) with one O(1) TRUNCATE.
+create or replace function truncate_rag_tables()
+returns void
+language sql
+security definer
+as $$
+    truncate table document_chunks, documents cascade;
+$$;
@@ -0,0 +1,36 @@
+-- Inserts a document record or returns the existing one matched by file
+-- hash, in a single round-trip. Called from PDFProcessor.process_pdf via
+-- supabase.rpc('upsert_document'); replaces the SELECT-by-hash followed by
+-- INSERT pair. `is_new` is false when the row already existed (xmax != 0
+-- marks a row touched by the ON CONFLICT update); `processed` lets the
+-- caller distinguish a finished document from one whose ingestion died
+-- partway, which has to be re-run.
+-- The unique index on file_hash is what ON CONFLICT arbitrates on; the
+-- baseline schema doesn't have one, so it's created here.
+create unique index if not exists idx_documents_file_hash
+    on documents (file_hash);
+
+-- CREATE OR REPLACE cannot change a function's return type (42P13)
+drop function if exists upsert_document(text, text, text, bigint, int, text, text, jsonb);
+
+create or replace function upsert_document(
+    p_filename text,
+    p_original_path text,
+    p_file_hash text,
+    p_file_size bigint,
+    p_total_pages int,
+    p_document_type text,
+    p_category text,
+    p_metadata jsonb
+)
+returns table (id uuid, is_new boolean, processed boolean)
+language sql
+as $$
+    insert into documents (filename, original_path, file_hash, file_size,
+                           total_pages, document_type, category, metadata, processed)
+    values (p_filename, p_original_path, p_file_hash, p_file_size,
+            p_total_pages, p_document_type, p_category, p_metadata, false)
+    on conflict (file_hash) do update
+        set filename = excluded.filename
+    returning documents.id, (xmax = 0) as is_new, documents.processed;
+$$;